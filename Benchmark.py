@@ -0,0 +1,250 @@
+import numpy as np
+from time import time
+
+import Models
+
+
+def legacy_check_walks(matrix, i, j):
+  """ Check possible walks on position i,j with bounds checks, as it 
+  was done before the sentinel border.
+
+  Parameters
+  -----------------------------------
+  matrix (np.array): NxN grid without border.
+  i (int): Y index of the array.
+  j (int): X index of the array.
+
+  Output
+  -----------------------------------
+  (list): Possible directions.
+  (list): Indices associated with each direction.
+
+  """
+  possible_walks = {1:(i,j-1), 
+                    2:(i,j+1), 
+                    3:(i-1,j), 
+                    4:(i+1,j)}
+  impossible_walks = []
+  for key, indexes in zip(possible_walks,possible_walks.values()):
+    try:
+      if matrix[indexes] != 0 or indexes[0] < 0 or indexes[1] < 0:
+        impossible_walks.append(key)
+    except:
+      impossible_walks.append(key)
+  for delete in impossible_walks:
+    possible_walks.pop(delete)
+  return list(possible_walks.keys()), list(possible_walks.values())
+
+
+class LegacySAW():
+  """ Copy of the SAW class before the sentinel border, kept to measure 
+  the gain of the current walker. It uses the global numpy random 
+  state, seeded with `np.random.seed`.
+
+  Parameters
+  ----------------------------------
+  N (int): Size of the latice.
+  initial_x (int): Initial x point.
+  initial_y (int): Initial y point.
+  """
+  def __init__(self,N: int, initial_x: int=0, initial_y: int=0):
+    self.grid = self._grid(N)
+    self.k = []
+
+    # Initial Value
+    self.x = [initial_x]
+    self.y = [initial_y]
+    
+    self.n_walks = self._evolution()    
+
+  def _evolution(self):
+    """ Makes the evolution of the SAW.
+
+    Outputs
+    -----------------------------------
+    (int): number of steps. 
+
+    """
+    # Set initial values    
+    initial = (self.x[0],self.y[0])
+    n_steps = 0
+    colide = False
+
+    # Do the first walk    
+    possible_walks,possible_values = self._check_walks(self.grid,*initial)  
+    
+    # Log possible walks
+    self.k.append(len(possible_walks))  
+    
+    direction = self._choose_uniformly(possible_walks)    
+    i,j = self._walk(self.grid, *initial, direction)
+    self.x.append(i)
+    self.y.append(j)
+    
+    n_steps += 1
+
+    while not colide:
+      possible_walks, possible_values = self._check_walks(self.grid, i, j)
+      
+      # Log possible walks
+      self.k.append(len(possible_walks))  
+
+      if len(possible_walks) == 0:
+        colide = True
+        
+        # Exclude last value because it is 0
+        self.k.pop(-1)
+        
+        break
+
+      direction = self._choose_uniformly(possible_walks)    
+      i,j = self._walk(self.grid, i, j, direction)      
+      self.x.append(i)
+      self.y.append(j)
+      
+      n_steps += 1            
+    
+    return n_steps
+
+  @property
+  def number_of_walks(self):
+    """ Returns the number of walks of the walker.
+
+    """
+    return self.n_walks  
+
+  def _grid(self, N: int):
+    """ Creates a NxN grid.
+
+    """
+    return np.zeros((N,N))
+
+  def _choose_uniformly(self, x: list):
+    """ Chooses uniformly a random value from an array.
+
+    """
+    n = len(x)
+    index = 0
+    if n > 1:
+      index = np.random.randint(0,high=n)     
+    return x[index]
+
+  def _walk(self, matrix: np.array, i: int, j: int, direction: int):
+    """ Walk on the grid, here we put a value for the direction:
+        1: Left
+        2: Right
+        3: Up
+        4: Down
+
+    """
+    # Check if it passes the lenght of the array
+    if i == len(matrix) or j == len(matrix):
+      print('Error')
+      return None, None
+    elif direction == 1:
+      matrix[i,j] = direction
+      return i,j-1
+    elif direction == 2:
+      matrix[i, j] = direction
+      return i,j+1
+    elif direction == 3:
+      matrix[i, j] = direction
+      return i-1,j
+    elif direction == 4:
+      matrix[i, j] = direction
+      return i+1,j
+
+  def _check_walks(self, matrix, i, j):
+    """ Check possible walks on position i,j, see `legacy_check_walks`.
+
+    """
+    return legacy_check_walks(matrix, i, j)
+
+
+def check_rate(N: int, n_checks: int=200000, seed: int=0):
+  """ Measures the rate of the choice of a step on an empty NxN grid, 
+  with the legacy bounds checks and uniform choice, and with the code 
+  that the current SAW runs at each step: the number of possible 
+  walks read from the free neighbor counts and `_choose_walk` on the 
+  flat sentinel-bordered grid.
+
+  Parameters
+  -----------------------------------
+  N (int): Size of the latice.
+  n_checks (int): Number of choices to time.
+  seed (int): Seed for the positions.
+
+  Output
+  -----------------------------------
+  (float): Legacy choices per second.
+  (float): Current choices per second.
+
+  """
+  rng = np.random.default_rng(seed)
+  i = rng.integers(0, N, size=n_checks).tolist()
+  j = rng.integers(0, N, size=n_checks).tolist()
+
+  walker = LegacySAW(N)
+  legacy = np.zeros((N,N))
+  start = time()
+  for a, b in zip(i, j):
+    possible_walks, possible_values = legacy_check_walks(legacy, a, b)
+    walker._choose_uniformly(possible_walks)
+  legacy_rate = n_checks/(time() - start)
+
+  saw = Models.SAW(N, rng=seed)
+  saw.reset()
+  grid, free = saw._grid_view, saw._free_view
+  stride = saw.lattice.stride
+  sites = [(a + 1)*stride + b + 1 for a, b in zip(i, j)]
+  start = time()
+  for site in sites:
+    k = free[site]
+    saw._choose_walk(grid, site, k)
+  current_rate = n_checks/(time() - start)
+
+  return legacy_rate, current_rate
+
+
+def step_rate(N: int, samples: int=200, seed: int=0):
+  """ Measures the number of steps per second of complete walks from 
+  a new grid, with the legacy SAW and with the current one. Both are 
+  seeded with the same seed.
+
+  Parameters
+  -----------------------------------
+  N (int): Size of the latice.
+  samples (int): Number of walks.
+  seed (int): Seed of the walks.
+
+  Output
+  -----------------------------------
+  (float): Legacy steps per second.
+  (float): Current steps per second.
+
+  """
+  np.random.seed(seed)
+  steps = 0
+  start = time()
+  for _ in range(samples):
+    steps += LegacySAW(N).number_of_walks
+  legacy_rate = steps/(time() - start)
+
+  rng = Models.RandomBuffer(seed)
+  steps = 0
+  start = time()
+  for _ in range(samples):
+    steps += Models.SAW(N, rng=rng).number_of_walks
+  current_rate = steps/(time() - start)
+
+  return legacy_rate, current_rate
+
+
+if __name__ == '__main__':
+  for N in [10, 100, 1000]:
+    legacy_rate, current_rate = check_rate(N)
+    legacy_steps, current_steps = step_rate(N)
+    print(f"N={N:5d} | legacy steps/s: {legacy_steps:10.0f} "
+          f"| SAW steps/s: {current_steps:10.0f} "
+          f"| step gain: {current_steps/legacy_steps:5.2f}x "
+          f"| step choice gain: {current_rate/legacy_rate:5.2f}x")
@@ -1,4 +1,263 @@
 import numpy as np
+from array import array
+from math import exp, inf, log, log1p
+from collections import defaultdict, namedtuple
+from functools import lru_cache
+
+# Value of the cells on the border of the grid, they are always occupied
+SENTINEL = -1
+
+# Directions of the walk 1: Left, 2: Right, 3: Up, 4: Down
+DIRECTIONS = (1, 2, 3, 4)
+DIRECTION_NAMES = ('Left', 'Right', 'Up', 'Down')
+
+class Lattice(namedtuple('Lattice', ['N', 'stride', 'offsets', 'empty', 'free', 
+                                     'neighbors', 'd'])):
+  """ Flat description of a grid of side N in d dimensions with a 
+  sentinel border, see `hypercubic_lattice`. The row neighbors[site] 
+  holds the flat indices of the neighbors of a site, one for each 
+  direction 1,...,z. When every site has its neighbors at the same 
+  distances they are also given as offsets, otherwise offsets is None.
+
+  """
+  __slots__ = ()
+
+  def site(self, point):
+    """ Returns the flat index of a point of the grid.
+
+    Parameters
+    -----------------------------------
+    point (tuple): Coordinates of the point, without the border.
+
+    Output
+    -----------------------------------
+    (int): Flat index of the point on the bordered grid.
+
+    """
+    site = 0
+    for coordinate in point:
+      site = site*self.stride + int(coordinate) + 1
+    return site
+
+  def points(self, sites: np.array):
+    """ Returns the coordinates of flat indices of the grid.
+
+    Parameters
+    -----------------------------------
+    sites (np.array): Flat indices on the bordered grid.
+
+    Output
+    -----------------------------------
+    (np.array): Coordinates without the border, with shape (...,d).
+
+    """
+    points = np.unravel_index(sites, (self.stride,)*self.d)
+    return np.stack(points, axis=-1) - 1
+
+
+def _bordered_lattice(N: int, d: int, offsets: tuple=None, 
+                      neighbors: np.array=None):
+  """ Builds the Lattice of a grid of side N in d dimensions from the 
+  neighbor offsets or from the table of neighbors. The rows of the 
+  table for the sentinel cells are never used and they are clipped 
+  to the grid.
+
+  Parameters
+  -----------------------------------
+  N (int): Size of the latice.
+  d (int): Dimension of the lattice.
+  offsets (tuple): Offsets of the directions. (default=None)
+  neighbors (np.array): Neighbors of each site, used when offsets 
+                        is None. (default=None)
+
+  Outputs
+  -----------------------------------
+  (Lattice): Description of the grid.
+
+  """
+  stride = N + 2
+  size = stride**d
+  if offsets is not None:
+    neighbors = np.arange(size)[:,None] + np.array(offsets)
+  neighbors = np.clip(neighbors, 0, size - 1)
+  neighbors.flags.writeable = False
+  
+  empty = np.full((stride,)*d, SENTINEL, dtype=np.int8)
+  empty[(slice(1, -1),)*d] = 0
+  empty = empty.ravel()
+  empty.flags.writeable = False
+
+  free = np.zeros(size, dtype=np.int8)
+  interior = np.flatnonzero(empty == 0)
+  free[interior] = (empty[neighbors[interior]] == 0).sum(axis=1)
+  free.flags.writeable = False
+  
+  return Lattice(N, stride, offsets, empty, free, neighbors, d)
+
+
+@lru_cache(maxsize=64)
+def hypercubic_lattice(N: int, d: int=2):
+  """ Builds the flat-index description of a grid of side N in d 
+  dimensions with a border of sentinel cells. The cell (i,j,...) of 
+  the bordered grid is stored at the flat index (i*stride + j)*stride
+  + ..., so the neighbors of a cell are found by adding the offsets. 
+  The directions 1,2 move along the last axis, 3,4 along the one 
+  before, and so on. The result is cached by N and d and shared by 
+  every walker, so it must not be modified.
+
+  Parameters
+  -----------------------------------
+  N (int): Size of the latice.
+  d (int): Dimension of the lattice. (default=2)
+
+  Outputs
+  -----------------------------------
+  (Lattice): stride of the rows, neighbor offsets for the directions
+             1,...,2d, a read-only empty grid and the read-only number 
+             of free neighbors of each cell of the empty grid.
+
+  """
+  stride = N + 2
+  offsets = tuple(sign*stride**axis for axis in range(d) for sign in (-1, 1))
+  return _bordered_lattice(N, d, offsets=offsets)
+
+
+def square_lattice(N: int):
+  """ Builds the flat-index description of a NxN grid with a border
+  of sentinel cells. The cell (i,j) of the bordered grid is stored at
+  the flat index i*stride + j, see `hypercubic_lattice`.
+
+  Parameters
+  -----------------------------------
+  N (int): Size of the latice.
+
+  Outputs
+  -----------------------------------
+  (Lattice): Description of the grid, the offsets are the ones of 
+             the directions 1,2,3,4.
+
+  """
+  return hypercubic_lattice(N, 2)
+
+
+@lru_cache(maxsize=64)
+def triangular_lattice(N: int):
+  """ Builds the flat-index description of a rhombus of side N of the 
+  triangular lattice, drawn as a NxN grid where each cell (i,j) is 
+  also a neighbor of (i-1,j+1) and (i+1,j-1). The directions 1,2,3,4
+  are the ones of the square lattice and 5,6 are the diagonals. The 
+  result is cached by N and must not be modified.
+
+  Parameters
+  -----------------------------------
+  N (int): Size of the latice.
+
+  Outputs
+  -----------------------------------
+  (Lattice): Description of the grid with coordination 6.
+
+  """
+  stride = N + 2
+  offsets = (-1, 1, -stride, stride, -stride + 1, stride - 1)
+  return _bordered_lattice(N, 2, offsets=offsets)
+
+
+@lru_cache(maxsize=64)
+def honeycomb_lattice(N: int):
+  """ Builds the flat-index description of a piece of the honeycomb
+  lattice, drawn as a NxN brick wall. Every cell (i,j) is a neighbor 
+  of (i,j-1) and (i,j+1), which are the directions 1,2, and the 
+  direction 3 goes to (i-1,j) when i+j is even and to (i+1,j) when 
+  it is odd. The neighbors depend on the cell, so they are only given 
+  as a table. The result is cached by N and must not be modified.
+
+  Parameters
+  -----------------------------------
+  N (int): Size of the latice.
+
+  Outputs
+  -----------------------------------
+  (Lattice): Description of the grid with coordination 3.
+
+  """
+  stride = N + 2
+  sites = np.arange(stride*stride)
+  i, j = np.divmod(sites, stride)
+  vertical = np.where((i + j) % 2 == 0, -stride, stride)
+  neighbors = np.stack((sites - 1, sites + 1, sites + vertical), axis=1)
+  return _bordered_lattice(N, 2, neighbors=neighbors)
+
+
+class RandomBuffer():
+  """ Buffer of uniform random numbers that are drawn in blocks from 
+  a numpy Generator and refilled when they are consumed. Each sampler 
+  owns its buffer, so there is no hidden global state. Independent 
+  streams for samplers running side by side can be made with 
+  `np.random.SeedSequence(seed).spawn(n)`.
+
+  Parameters
+  ----------------------------------
+  rng (np.random.Generator, int or None): Generator or seed.
+  block_size (int): Number of random numbers drawn at once.
+  """
+  __slots__ = ('rng', 'block_size', '_block', '_index')
+
+  def __init__(self, rng=None, block_size: int=1024):
+    self.rng = np.random.default_rng(rng)
+    self.block_size = block_size
+    self._block = []
+    self._index = 0
+
+  def uniform(self):
+    """ Returns an uniform random number in [0,1).
+
+    """
+    if self._index == len(self._block):
+      # Python floats are faster to read one at a time than numpy scalars
+      self._block = self.rng.random(self.block_size).tolist()
+      self._index = 0
+    u = self._block[self._index]
+    self._index += 1
+    return u
+
+
+def random_buffer(rng=None):
+  """ Returns rng if it already is a RandomBuffer, so samplers can 
+  share one buffer, otherwise creates a buffer for it.
+
+  Parameters
+  -----------------------------------
+  rng (RandomBuffer, np.random.Generator, int or None): Generator or seed.
+
+  Output
+  -----------------------------------
+  (RandomBuffer): Buffer of random numbers.
+
+  """
+  if isinstance(rng, RandomBuffer):
+    return rng
+  return RandomBuffer(rng)
+
+
+def logaddexp(a: float, b: float):
+  """ Returns log(exp(a) + exp(b)) for floats without overflow.
+
+  Parameters
+  -----------------------------------
+  a (float): First log value.
+  b (float): Second log value.
+
+  Output
+  -----------------------------------
+  (float): Log of the sum.
+
+  """
+  if a < b:
+    a, b = b, a
+  if b == -inf:
+    return a
+  return a + log1p(exp(b - a))
+
 
 class SAW():
   """ Class for the Self-Avoiding Walk.
@@ -8,14 +267,38 @@ class SAW():
   N (int): Size of the latice.
   initial_x (int): Initial x point.
   initial_y (int): Initial y point.
+  rng (RandomBuffer, np.random.Generator, int or None): Random number 
+                    generator or seed. (default=None)
   """
-  def __init__(self,N: int, initial_x: int=0, initial_y: int=0):
+  __slots__ = ('lattice', 'grid', 'free', 'random', 'n_walks', 'log_weight',
+               '_x', '_y', '_k', '_k_size', '_grid_view', '_free_view')
+
+  def __init__(self,N: int, initial_x: int=0, initial_y: int=0, rng=None):
+    self.lattice = square_lattice(N)
+    self.random = random_buffer(rng)
     self.grid = self._grid(N)
-    self.k = []
+    
+    # Number of free neighbors of each cell
+    self.free = self.lattice.free.copy()
+
+    # Single cells of a memoryview are read as Python ints, which is 
+    # much faster than reading numpy scalars in the step loop
+    self._grid_view = memoryview(self.grid)
+    self._free_view = memoryview(self.free)
+    
+    # Preallocated path and number of possible walks, a walk visits 
+    # at most N*N cells
+    self._x = np.empty(N*N, dtype=np.int16)
+    self._y = np.empty(N*N, dtype=np.int16)
+    self._k = np.empty(N*N, dtype=np.uint8)
+    self._k_size = 0
+    
+    # Running log of the weight 1/trial_probability
+    self.log_weight = 0.
 
     # Initial Value
-    self.x = [initial_x]
-    self.y = [initial_y]
+    self._x[0] = initial_x
+    self._y[0] = initial_y
     
     
     self.n_walks = self._evolution()    
@@ -35,55 +318,66 @@ class SAW():
 
 
     """
-    # Set initial values    
-    initial = (self.x[0],self.y[0])
+    # Set initial values, the grid is shifted by the sentinel border
+    stride = self.lattice.stride
+    site = (int(self._x[0]) + 1)*stride + int(self._y[0]) + 1
+    grid, free = self._grid_view, self._free_view
     n_steps = 0
+    log_weight = 0.
     colide = False
 
-    # Do the first walk    
-    possible_walks,possible_values = self._check_walks(self.grid,*initial)  
-    
-    # Log possible walks
-    self.k.append(len(possible_walks))  
-    
-    direction = self._choose_uniformly(possible_walks)    
-    i,j = self._walk(self.grid, *initial, direction, debug=debug)
-    self.x.append(i)
-    self.y.append(j)
-    
-    n_steps += 1
-    
-
     while not colide:
-      possible_walks, possible_values = self._check_walks(self.grid, i, j)
+      # The number of possible walks is kept up to date by _walk
+      k = free[site]
       
-      # Log possible walks
-      self.k.append(len(possible_walks))  
-
       # Check if there is no possible ways to walk 
       # if this is the case then the walker colided and it is terminated
       
-      if len(possible_walks) == 0:
+      if k == 0:
         colide = True
-        
-        # Exclude last value because it is 0
-        self.k.pop(-1)
-        
         break
 
-      direction = self._choose_uniformly(possible_walks)    
-      i,j = self._walk(self.grid, i, j, direction, debug=debug)      
-      self.x.append(i)
-      self.y.append(j)
+      # Log possible walks
+      self._k[n_steps] = k  
+      log_weight += log(k)
+
+      direction = self._choose_walk(grid, site, k)    
+      site = self._walk(grid, site, direction, debug=debug)      
+      i,j = divmod(site, stride)
+      self._x[n_steps + 1] = i - 1
+      self._y[n_steps + 1] = j - 1
       
       n_steps += 1            
       
       if plot:
-        plt.imshow(self.grid)
+        plt.imshow(self.grid.reshape(stride, stride))
         plt.show()
     
+    self._k_size = n_steps
+    self.log_weight = log_weight
     return n_steps
 
+  @property
+  def x(self):
+    """ Returns the x points of the walk as a view of the path.
+
+    """
+    return self._x[:self.n_walks + 1]
+
+  @property
+  def y(self):
+    """ Returns the y points of the walk as a view of the path.
+
+    """
+    return self._y[:self.n_walks + 1]
+
+  @property
+  def k(self):
+    """ Returns the number of possible walks at each step as a view.
+
+    """
+    return self._k[:self._k_size]
+
   @property
   def number_of_walks(self):
     """ Returns the number of walks of the walker.
@@ -93,14 +387,72 @@ class SAW():
 
   @property
   def trial_probability(self):
-    """ Return the trial probability function.
+    """ Return the trial probability function, it underflows to 0 
+    for long walks, see `log_trial_probability`.
+
+    """
+    return np.exp(self.log_trial_probability)
+
+  @property
+  def log_trial_probability(self):
+    """ Return the log of the trial probability function.
+
+    """
+    return -self.log_weight
+
+  def reset(self, initial_x: int=None, initial_y: int=None):
+    """ Clears the walk so the walker can be run again. Only the cells
+    of the recorded path are cleared, the grid is not reallocated.
+
+    Parameters
+    -----------------------------------
+    initial_x (int): New initial x point, if None it is kept. 
+                     (default=None)
+    initial_y (int): New initial y point, if None it is kept. 
+                     (default=None)
+
+    """
+    stride = self.lattice.stride
+    sites = (self.x.astype(np.intp) + 1)*stride + self.y + 1
+    
+    # Every cell of the path but the last one was occupied by _walk, 
+    # so they give back a free neighbor to their neighbors
+    left = sites[:-1, None] + np.array(self.lattice.offsets)
+    np.add.at(self.free, left.ravel(), 1)
+    self.grid[sites] = 0
+    
+    if initial_x is not None:
+      self._x[0] = initial_x
+    if initial_y is not None:
+      self._y[0] = initial_y
+    
+    self._k_size = 0
+    self.log_weight = 0.
+    self.n_walks = 0
+
+  def run(self):
+    """ Resets the walker and makes a new walk.
+
+    Outputs
+    -----------------------------------
+    (int): number of steps.
+
+    """
+    self.reset()
+    self.n_walks = self._evolution()
+    return self.n_walks
+
+  def record(self):
+    """ Returns the walk as a compact WalkRecord.
 
     """
-    g = (1/np.array(self.k)).cumprod()
-    return g[-1]
+    return WalkRecord.from_path(self.x, self.y)
 
   def _grid(self, N: int):
-    """ Creates a NxN grid.
+    """ Creates a NxN grid surrounded by a border of sentinel
+    cells. The sentinels are always occupied, so a walker can 
+    never step outside the grid. The grid is stored as a flat 
+    array, see `square_lattice`.
 
     Parameters 
     -----------------------------------
@@ -110,11 +462,11 @@ class SAW():
 
     Outputs
     -----------------------------------
-    (np.array): NxN grid
+    (np.array): flat (N+2)*(N+2) grid
 
 
     """
-    return np.zeros((N,N))
+    return square_lattice(N).empty.copy()
 
   def _choose_uniformly(self, x: list):
     """ Chooses uniformly a random value from an array.
@@ -132,11 +484,11 @@ class SAW():
     n = len(x)
     index = 0
     if n > 1:
-      index = np.random.randint(0,high=n)     
+      index = int(self.random.uniform()*n)     
     return x[index]
 
   def _walk(self, matrix: np.array
-               ,i: int,j: int
+               ,site: int
                ,direction: int, debug=False):
     """ Walk on the grid, here we put a value for the direction:
         1: Left
@@ -147,124 +499,144 @@ class SAW():
 
     Parameters
     -----------------------------------
-    matrix (np.array): Grid that you wand to walk.
-    i (int): Y index of the array.
-    j (int): X index of the array.
+    matrix (np.array or memoryview): Flat grid with sentinel border 
+                                     that you wand to walk.
+    site (int): Flat index of the current position.
     direction (int): Direction of the step.
     debug (boolean): True if you want to debug the function.
                      (Default=False).    
 
+    Output
+    -----------------------------------
+    (int): Flat index of the new position.
+
     """
-    # Check if it passes the lenght of the array
-    if i == len(matrix) or j == len(matrix):
-      print('Error')
-      return None, None
-    
-    # Check if it is going left
-    elif direction == 1:
-      if debug:
-        print('Left')
-      matrix[i,j] = direction
-      return i,j-1
+    if debug:
+      print(DIRECTION_NAMES[direction - 1])
+    matrix[site] = direction
     
-    # Check if it is going right
-    elif direction == 2:
-      if debug:
-        print('Right')
-      matrix[i, j] = direction
-      return i,j+1
+    # The neighbors of the occupied cell lose one free neighbor
+    free = self._free_view
+    for offset in self.lattice.offsets:
+      free[site + offset] -= 1
     
-    # Check if it is going up
-    elif direction == 3:
-      if debug:
-        print('Up')
-      matrix[i, j] = direction
-      return i-1,j
+    return site + self.lattice.offsets[direction - 1]
 
-    # Check if it is going down
-    elif direction == 4:
-      if debug:
-        print('Down')
-      matrix[i, j] = direction
-      return i+1,j
+  def _unwalk(self, matrix, site: int):
+    """ Undo the walk that left a cell, the cell is cleared and its 
+    neighbors get back one free neighbor.
 
-  def _check_walks(self, matrix,i,j):
-    """ Check possible walks on position i,j.
-    
+    Parameters
+    -----------------------------------
+    matrix (np.array or memoryview): Flat grid with sentinel border 
+                                     that you wand to walk.
+    site (int): Flat index of the cell that the walker goes back to.
+
+    """
+    matrix[site] = 0
+    free = self._free_view
+    for offset in self.lattice.offsets:
+      free[site + offset] += 1
+
+  def _choose_walk(self, matrix, site: int, k: int):
+    """ Chooses uniformly one of the k possible walks on a position,
+    the directions are only searched until the chosen one is found.
 
     Parameters
     -----------------------------------
-    matrix (np.array): Grid that you wand to walk.
-    i (int): Y index of the array.
-    j (int): X index of the array.
-    
+    matrix (np.array or memoryview): Flat grid with sentinel border 
+                                     that you wand to walk.
+    site (int): Flat index of the position.
+    k (int): Number of possible walks, it must be larger than 0.
+
     Output
     -----------------------------------
-    (dict): Dictionary with possible walks, keys are directions
-            1,2,3,4 and values are indices associated with each
-            direction.
+    (int): Direction chosen.
 
     """
-    possible_walks = {1:(i,j-1), 
-                      2:(i,j+1), 
-                      3:(i-1,j), 
-                      4:(i+1,j)}
-    # Create a list for all directions that are not possible
-    impossible_walks = []
+    index = 0
+    if k > 1:
+      index = int(self.random.uniform()*k)
+    for direction, offset in enumerate(self.lattice.offsets, 1):
+      if matrix[site + offset] == 0:
+        if index == 0:
+          return direction
+        index -= 1
 
-    # See impossible walks
-    for key, indexes in zip(possible_walks,possible_walks.values()):
-      try:
-        if matrix[indexes] != 0 or indexes[0] < 0 or indexes[1] < 0:
-          impossible_walks.append(key)
-      except:
-        impossible_walks.append(key)
+  def _check_walks(self, matrix, site):
+    """ Check possible walks on a position.
+    
 
-    # Delete from the dict all impossible walks
-    for delete in impossible_walks:
-      possible_walks.pop(delete)
+    Parameters
+    -----------------------------------
+    matrix (np.array): Flat grid with sentinel border that you wand 
+                       to walk.
+    site (int): Flat index of the position.
     
-    # Return all possible walks and all indices
-    return list(possible_walks.keys()), list(possible_walks.values())
+    Output
+    -----------------------------------
+    (list): Possible directions 1,2,3,4.
+    (list): Flat indices associated with each possible direction.
 
+    """
+    # The sentinel border is occupied, so there is no bounds check
+    neighbors = [site + offset for offset in self.lattice.offsets]
+    possible_walks = [direction for direction, neighbor 
+                      in enumerate(neighbors, 1) if matrix[neighbor] == 0]
+    possible_values = [neighbors[direction - 1] for direction in possible_walks]
+    return possible_walks, possible_values
 
-class SAWEarly(SAW):
-  """ Class for the Self-Avoiding Walk with a 
-  early termination probability.
+
+class LatticeSAW(SAW):
+  """ Class for the Self-Avoiding Walk on any Lattice, such as the 
+  grids of `hypercubic_lattice` in d dimensions, `triangular_lattice`
+  or `honeycomb_lattice`. The walk is grown as in SAW, with the same 
+  grid and free neighbor counts, but the neighbors of a site are read
+  from the table of the lattice, so the directions are 1,...,z for 
+  the coordination z of the lattice. The path is kept as flat indices 
+  of the bordered grid.
 
   Parameters
   ----------------------------------
-  N (int): Size of the latice.
-  initial_x (int): Initial x point.
-  initial_y (int): Initial y point.
-  terminate_probability(float): Probability that a walk can terminate at each 
-                                step.
-
+  lattice (Lattice): Description of the grid.
+  initial (tuple): Initial point, if None it is the origin. 
+                   (default=None)
+  rng (RandomBuffer, np.random.Generator, int or None): Random number 
+                    generator or seed. (default=None)
   """
-  def __init__(self, 
-               N: int, 
-               initial_x: int=0, 
-               initial_y: int=0, 
-               terminate_probability: float=0.1):
-    
-    self.terminate_probability = terminate_probability
-    super(SAWEarly, self).__init__(N,initial_x,initial_y)
-        
+  __slots__ = ('_sites', '_table', '_z')
 
-  @property
-  def trial_probability(self):
-    """ Return the trial probability function.
+  def __init__(self, lattice: Lattice, initial: tuple=None, rng=None):
+    self.lattice = lattice
+    self.random = random_buffer(rng)
+    self.grid = lattice.empty.copy()
+    self.free = lattice.free.copy()
+    self._grid_view = memoryview(self.grid)
+    self._free_view = memoryview(self.free)
+    
+    # The neighbors of site are table[site*z:(site + 1)*z]
+    self._z = lattice.neighbors.shape[1]
+    self._table = memoryview(lattice.neighbors.ravel())
+    
+    # Preallocated path and number of possible walks
+    size = lattice.N**lattice.d
+    self._sites = np.empty(size, dtype=np.int64)
+    self._k = np.empty(size, dtype=np.uint8)
+    self._k_size = 0
+    self.log_weight = 0.
+    self.n_walks = 0
 
-    """
-    g = (1/np.array(self.k)).cumprod()
-    return g[-1]*(1 - self.terminate_probability)**self.n_walks
+    # Initial Value
+    self._sites[0] = lattice.site((0,)*lattice.d if initial is None else initial)
+    
+    self.n_walks = self._evolution()
 
   def _evolution(self, plot=False, debug=False):
     """ Makes the evolution of the SAW.
 
     Parameters 
     -----------------------------------
-    plot (bool): True if you want to plot. (default=False)
+    plot (bool): Not used, kept for SAW. (default=False)
     debug (bool): True if you want to debug. (default=False)
 
 
@@ -274,60 +646,2954 @@ class SAWEarly(SAW):
 
 
     """
-    # Set initial values    
-    initial = (self.x[0],self.y[0])
+    site = int(self._sites[0])
+    grid, free = self._grid_view, self._free_view
     n_steps = 0
-    colide = False
+    log_weight = 0.
 
-    # Do the first walk    
-    possible_walks,possible_values = self._check_walks(self.grid,*initial)  
-    
+    while True:
+      # The number of possible walks is kept up to date by _walk
+      k = free[site]
+      if k == 0:
+        break
 
-    # Log possible walks
-    self.k.append(len(possible_walks))  
+      # Log possible walks
+      self._k[n_steps] = k  
+      log_weight += log(k)
+
+      direction = self._choose_walk(grid, site, k)    
+      site = self._walk(grid, site, direction, debug=debug)      
+      self._sites[n_steps + 1] = site
+      
+      n_steps += 1            
     
-    if np.random.uniform() < self.terminate_probability:
-      colide = True
+    self._k_size = n_steps
+    self.log_weight = log_weight
+    return n_steps
+
+  def reset(self, initial: tuple=None):
+    """ Clears the walk so the walker can be run again. Only the cells
+    of the recorded path are cleared, the grid is not reallocated.
+
+    Parameters
+    -----------------------------------
+    initial (tuple): New initial point, if None it is kept. 
+                     (default=None)
 
-    direction = self._choose_uniformly(possible_walks)    
-    i,j = self._walk(self.grid, *initial, direction, debug=debug)
-    self.x.append(i)
-    self.y.append(j)
+    """
+    sites = self._sites[:self.n_walks + 1]
+    left = self.lattice.neighbors[sites[:-1]]
+    np.add.at(self.free, left.ravel(), 1)
+    self.grid[sites] = 0
     
-    n_steps += 1
+    if initial is not None:
+      self._sites[0] = self.lattice.site(initial)
     
+    self._k_size = 0
+    self.log_weight = 0.
+    self.n_walks = 0
 
-    while not colide:
-      possible_walks, possible_values = self._check_walks(self.grid, i, j)
-      
-      # Log possible walks
-      self.k.append(len(possible_walks))  
+  def _walk(self, matrix, site: int, direction: int, debug=False):
+    """ Walk on the grid, the direction is kept on the cell that is 
+    left and its neighbors lose one free neighbor.
 
-      # Check if there is no possible ways to walk 
-      # if this is the case then the walker colided and it is terminated
-      if np.random.uniform() < self.terminate_probability:
-        colide = True
-        if len(possible_walks) == 0:
-          self.k.pop(-1)    
-        break
+    Parameters
+    -----------------------------------
+    matrix (np.array or memoryview): Flat grid with sentinel border 
+                                     that you wand to walk.
+    site (int): Flat index of the current position.
+    direction (int): Direction of the step, from 1 to z.
+    debug (boolean): True if you want to debug the function.
+                     (Default=False).    
 
-      if len(possible_walks) == 0:
-        colide = True
-        
-        # Exclude last value because it is 0
-        self.k.pop(-1)
-        
-        break
+    Output
+    -----------------------------------
+    (int): Flat index of the new position.
 
-      direction = self._choose_uniformly(possible_walks)    
-      i,j = self._walk(self.grid, i, j, direction, debug=debug)      
-      self.x.append(i)
-      self.y.append(j)
-      
-      n_steps += 1            
-      
-      if plot:
-        plt.imshow(self.grid)
-        plt.show()
+    """
+    if debug:
+      # Directions of the square lattice have names, see SAW._walk
+      stride = self.lattice.stride
+      if self.lattice.offsets == (-1, 1, -stride, stride):
+        print(DIRECTION_NAMES[direction - 1])
+      else:
+        print(f'Direction {direction}')
+    matrix[site] = direction
     
-    return n_steps
\ No newline at end of file
+    table, start = self._table, site*self._z
+    free = self._free_view
+    for index in range(start, start + self._z):
+      free[table[index]] -= 1
+    
+    return table[start + direction - 1]
+
+  def _unwalk(self, matrix, site: int):
+    """ Undo the walk that left a cell, the cell is cleared and its 
+    neighbors get back one free neighbor.
+
+    Parameters
+    -----------------------------------
+    matrix (np.array or memoryview): Flat grid with sentinel border 
+                                     that you wand to walk.
+    site (int): Flat index of the cell that the walker goes back to.
+
+    """
+    matrix[site] = 0
+    table, start = self._table, site*self._z
+    free = self._free_view
+    for index in range(start, start + self._z):
+      free[table[index]] += 1
+
+  def _choose_walk(self, matrix, site: int, k: int):
+    """ Chooses uniformly one of the k possible walks on a position,
+    the directions are only searched until the chosen one is found.
+
+    Parameters
+    -----------------------------------
+    matrix (np.array or memoryview): Flat grid with sentinel border 
+                                     that you wand to walk.
+    site (int): Flat index of the position.
+    k (int): Number of possible walks, it must be larger than 0.
+
+    Output
+    -----------------------------------
+    (int): Direction chosen.
+
+    """
+    index = 0
+    if k > 1:
+      index = int(self.random.uniform()*k)
+    table, start = self._table, site*self._z
+    for direction in range(1, self._z + 1):
+      if matrix[table[start + direction - 1]] == 0:
+        if index == 0:
+          return direction
+        index -= 1
+
+  @property
+  def sites(self):
+    """ Returns the flat indices of the walk as a view of the path.
+
+    """
+    return self._sites[:self.n_walks + 1]
+
+  @property
+  def points(self):
+    """ Returns the points of the walk, with shape (n+1,d).
+
+    """
+    return self.lattice.points(self.sites)
+
+  @property
+  def x(self):
+    """ Returns the first coordinate of the points of the walk.
+
+    """
+    return self.points[:,0]
+
+  @property
+  def y(self):
+    """ Returns the second coordinate of the points of the walk.
+
+    """
+    return self.points[:,1]
+
+
+class WalkRecord():
+  """ Compact record of a walk on the square lattice, it keeps the 
+  initial point and the directions 1,2,3,4 of the moves packed in 
+  2 bits, four moves per byte. The points of the walk are only 
+  reconstructed when they are asked for.
+
+  Parameters
+  ----------------------------------
+  initial_x (int): Initial x point.
+  initial_y (int): Initial y point.
+  moves (np.array): Packed moves as uint8.
+  n_moves (int): Number of moves.
+  """
+  __slots__ = ('initial_x', 'initial_y', 'moves', 'n_moves')
+
+  # Change of x and y for the directions 1,2,3,4
+  DX = np.array([0, 0, -1, 1], dtype=np.int64)
+  DY = np.array([-1, 1, 0, 0], dtype=np.int64)
+
+  def __init__(self, initial_x: int, initial_y: int, 
+               moves: np.array, n_moves: int):
+    self.initial_x = initial_x
+    self.initial_y = initial_y
+    self.moves = moves
+    self.n_moves = n_moves
+
+  @classmethod
+  def from_path(cls, x: np.array, y: np.array):
+    """ Creates the record from the points of a walk.
+
+    Parameters
+    -----------------------------------
+    x (np.array): x points of the walk.
+    y (np.array): y points of the walk.
+
+    Output
+    -----------------------------------
+    (WalkRecord): Record of the walk.
+
+    """
+    dx = np.diff(np.asarray(x, dtype=np.int64))
+    dy = np.diff(np.asarray(y, dtype=np.int64))
+    assert np.all(np.abs(dx) + np.abs(dy) == 1), "Steps must be unitary."
+    
+    # Directions 1: Left, 2: Right, 3: Up, 4: Down stored as 0,1,2,3
+    codes = np.where(dx == 0, (dy + 1)//2, 2 + (dx + 1)//2).astype(np.uint8)
+    return cls(int(x[0]), int(y[0]), cls.pack(codes), codes.size)
+
+  @staticmethod
+  def pack(codes: np.array):
+    """ Packs 2-bit codes, four codes per byte.
+
+    Parameters
+    -----------------------------------
+    codes (np.array): Codes 0,1,2,3.
+
+    Output
+    -----------------------------------
+    (np.array): Packed codes as uint8.
+
+    """
+    padded = np.zeros(-(-codes.size//4)*4, dtype=np.uint8)
+    padded[:codes.size] = codes
+    padded = padded.reshape(-1, 4)
+    return padded[:,0] | padded[:,1] << 2 | padded[:,2] << 4 | padded[:,3] << 6
+
+  @property
+  def directions(self):
+    """ Returns the directions 1,2,3,4 of the moves.
+
+    """
+    shifts = np.array([0, 2, 4, 6], dtype=np.uint8)
+    codes = (self.moves[:,None] >> shifts) & 3
+    return codes.ravel()[:self.n_moves] + 1
+
+  @property
+  def x(self):
+    """ Returns the x points of the walk.
+
+    """
+    steps = self.DX[self.directions - 1]
+    return np.concatenate(([0], steps.cumsum())) + self.initial_x
+
+  @property
+  def y(self):
+    """ Returns the y points of the walk.
+
+    """
+    steps = self.DY[self.directions - 1]
+    return np.concatenate(([0], steps.cumsum())) + self.initial_y
+
+  @property
+  def nbytes(self):
+    """ Returns the number of bytes used by the packed moves.
+
+    """
+    return self.moves.nbytes
+
+  def __len__(self):
+    return self.n_moves
+
+
+class SAWEarly(SAW):
+  """ Class for the Self-Avoiding Walk with a 
+  early termination probability.
+
+  Parameters
+  ----------------------------------
+  N (int): Size of the latice.
+  initial_x (int): Initial x point.
+  initial_y (int): Initial y point.
+  terminate_probability(float, array or callable): Probability that a walk 
+                                can terminate at each step. It can depend 
+                                on the length n of the walk, given as an 
+                                array p[n], where the last value is used 
+                                for the longer walks, or as a function 
+                                p(n). The weight is corrected by the 
+                                product of 1 - p(n).
+  rng (RandomBuffer, np.random.Generator, int or None): Random number 
+                    generator or seed. (default=None)
+
+  """
+  __slots__ = ('terminate_probability',)
+
+  def __init__(self, 
+               N: int, 
+               initial_x: int=0, 
+               initial_y: int=0, 
+               terminate_probability: float=0.1,
+               rng=None):
+    
+    self.terminate_probability = terminate_probability
+    super(SAWEarly, self).__init__(N,initial_x,initial_y,rng)
+        
+  def _schedule(self):
+    """ Returns the termination probability as a function of the 
+    length of the walk.
+
+    Outputs
+    -----------------------------------
+    (callable): Function p(n).
+
+    """
+    schedule = self.terminate_probability
+    if callable(schedule):
+      return schedule
+    
+    table = np.atleast_1d(schedule).astype(float).tolist()
+    last = len(table) - 1
+    return lambda n: table[n if n < last else last]
+
+  def _evolution(self, plot=False, debug=False):
+    """ Makes the evolution of the SAW.
+
+    Parameters 
+    -----------------------------------
+    plot (bool): True if you want to plot. (default=False)
+    debug (bool): True if you want to debug. (default=False)
+
+
+    Outputs
+    -----------------------------------
+    (int): number of steps. 
+
+
+    """
+    # Set initial values, the grid is shifted by the sentinel border
+    stride = self.lattice.stride
+    site = (int(self._x[0]) + 1)*stride + int(self._y[0]) + 1
+    grid, free = self._grid_view, self._free_view
+    n_steps = 0
+    colide = False
+
+    # Do the first walk    
+    k = free[site]
+
+    # Log possible walks, each step also has a probability 
+    # of surviving the termination
+    schedule = self._schedule()
+    p = schedule(0)
+    self._k[0] = k  
+    log_weight = log(k)
+    n_k = 1
+
+    # With p = 1 the walk always ends here, so there is no survival
+    if p < 1:
+      log_weight -= log(1 - p)
+    
+    if self.random.uniform() < p:
+      colide = True
+
+    direction = self._choose_walk(grid, site, k)    
+    site = self._walk(grid, site, direction, debug=debug)
+    i,j = divmod(site, stride)
+    self._x[1] = i - 1
+    self._y[1] = j - 1
+    
+    n_steps += 1
+    
+
+    while not colide:
+      k = free[site]
+      
+      # Log possible walks
+      self._k[n_k] = k  
+      n_k += 1
+
+      # Check if there is no possible ways to walk 
+      # if this is the case then the walker colided and it is terminated
+      p = schedule(n_steps)
+      if self.random.uniform() < p:
+        colide = True
+        if k == 0:
+          n_k -= 1    
+        else:
+          log_weight += log(k)
+        break
+
+      if k == 0:
+        colide = True
+        
+        # Exclude last value because it is 0
+        n_k -= 1
+        
+        break
+
+      log_weight += log(k) - log(1 - p)
+
+      direction = self._choose_walk(grid, site, k)    
+      site = self._walk(grid, site, direction, debug=debug)      
+      i,j = divmod(site, stride)
+      self._x[n_steps + 1] = i - 1
+      self._y[n_steps + 1] = j - 1
+      
+      n_steps += 1            
+      
+      if plot:
+        plt.imshow(self.grid.reshape(stride, stride))
+        plt.show()
+    
+    self._k_size = n_k
+    self.log_weight = log_weight
+    return n_steps
+
+
+def flat_schedule(lengths: np.array, max_length: int=None):
+  """ Derives the termination schedule p(n) for SAWEarly that makes 
+  the lengths of the walks as evenly spread as possible. The pilot 
+  lengths come from walks that only stop when they are trapped, such 
+  as SAW or SAWBatch, and give the probability q(n) that a walk of 
+  length n is trapped. Termination can only make walks shorter, so 
+  the schedule ends the same fraction c of the walks at each length, 
+  or only the trapped ones where trapping alone ends more than c, and 
+  c is chosen by bisection so that a fraction c is left at max_length. 
+  The first step is never terminated, since SAWEarly always takes it.
+
+  The target max_length decides how flat the result is. Walks longer 
+  than it are never sampled, and since few pilot walks get close to 
+  the longest one, a target near it leaves a tiny c and a schedule 
+  that is zero up to the last length, which does not flatten at all. 
+  The median pilot length flattens the lengths up to a typical walk.
+
+  Parameters
+  -----------------------------------
+  lengths (np.array): Lengths of the pilot walks.
+  max_length (int): Length where every walk is terminated, if None it 
+                    is the median pilot length. (default=None)
+
+  Outputs
+  -----------------------------------
+  (np.array): Termination probability p[n] for n = 0,...,max_length.
+
+  """
+  lengths = np.asarray(lengths, dtype=np.int64)
+  if max_length is None:
+    max_length = int(np.median(lengths))
+  
+  # Probability of being trapped at each length
+  ends = np.bincount(lengths, minlength=max_length + 1)
+  reached = ends[::-1].cumsum()[::-1]
+  q = np.where(reached > 0, ends/np.maximum(reached, 1), 1.)[:max_length + 1]
+
+  def terminate(c: float):
+    """ Ends a fraction c of the walks at each length.
+
+    """
+    schedule = np.ones(max_length + 1)
+    schedule[0] = 0.
+    
+    # Fraction of walks that reach the length n
+    reach = 1 - q[0]
+    for n in range(1, max_length):
+      survive = reach*(1 - q[n])
+      if survive <= 0:
+        return schedule, 0.
+      target = min(max(reach - c, 0.), survive)
+      schedule[n] = 1 - target/survive
+      reach = target
+    return schedule, reach
+
+  low, high = 0., 1.
+  for _ in range(60):
+    c = (low + high)/2
+    if terminate(c)[1] > c:
+      low = c
+    else:
+      high = c
+  return terminate(high)[0]
+
+
+class LookAheadSAW(SAW):
+  """ Class for the Self-Avoiding Walk with look-ahead. Before each 
+  step the walks of depth steps from the current point are counted, 
+  and the walker only chooses among the moves that can still be 
+  extended to depth steps, so it does not walk into pockets where it 
+  dies within depth steps. The weight is the product of the number of 
+  viable moves.
+  
+  A walk of length n is sampled with weight W_n only if it can be 
+  extended by depth-1 steps, so W_n times the number X of extensions 
+  of depth steps is an unbiased estimate of the number of walks of 
+  length n+depth. The lengths below depth are counted exactly from 
+  the initial point. These estimates are kept in log_counts, and 
+  their mean over many walks estimates the number of walks of each 
+  length. With depth=1 this is the walk of SAW.
+
+  Parameters
+  ----------------------------------
+  N (int): Size of the latice.
+  initial_x (int): Initial x point.
+  initial_y (int): Initial y point.
+  depth (int): Number of steps of the look-ahead. (default=2)
+  rng (RandomBuffer, np.random.Generator, int or None): Random number 
+                    generator or seed. (default=None)
+
+  """
+  __slots__ = ('depth', 'log_counts')
+
+  def __init__(self, 
+               N: int, 
+               initial_x: int=0, 
+               initial_y: int=0, 
+               depth: int=2,
+               rng=None):
+    
+    assert depth >= 1, "The depth must be at least 1."
+    self.depth = depth
+    super(LookAheadSAW, self).__init__(N,initial_x,initial_y,rng)
+
+  def _evolution(self, plot=False, debug=False):
+    """ Makes the evolution of the SAW with look-ahead.
+
+    Parameters 
+    -----------------------------------
+    plot (bool): True if you want to plot. (default=False)
+    debug (bool): True if you want to debug. (default=False)
+
+
+    Outputs
+    -----------------------------------
+    (int): number of steps. 
+
+
+    """
+    # Set initial values, the grid is shifted by the sentinel border
+    stride = self.lattice.stride
+    offsets = self.lattice.offsets
+    site = (int(self._x[0]) + 1)*stride + int(self._y[0]) + 1
+    grid = self._grid_view
+    depth = self.depth
+    N2 = self.lattice.N**2
+    
+    log_counts = [-inf]*(N2 + depth)
+    log_counts[0] = 0.
+    n_steps = 0
+    log_weight = 0.
+
+    while True:
+      # Count the extensions of each neighbor with the walker standing 
+      # on the current point
+      grid[site] = SENTINEL
+      viable = []
+      extensions = [0]*depth
+      for direction, offset in zip(DIRECTIONS, offsets):
+        if grid[site + offset] == 0:
+          counts = self._extensions(grid, site + offset, depth - 1)
+          for j in range(depth):
+            extensions[j] += counts[j]
+          if counts[depth - 1] > 0:
+            viable.append(direction)
+      grid[site] = 0
+
+      # Estimates of the number of walks, exact for the first lengths
+      if n_steps == 0:
+        for j in range(1, depth):
+          if extensions[j - 1] > 0:
+            log_counts[j] = log(extensions[j - 1])
+      if extensions[depth - 1] > 0:
+        log_counts[n_steps + depth] = log_weight + log(extensions[depth - 1])
+
+      # The walker stops when no move can be extended to depth steps
+      k = len(viable)
+      if k == 0:
+        break
+
+      # Log possible walks
+      self._k[n_steps] = k  
+      log_weight += log(k)
+
+      direction = self._choose_uniformly(viable)
+      site = self._walk(grid, site, direction, debug=debug)      
+      i,j = divmod(site, stride)
+      self._x[n_steps + 1] = i - 1
+      self._y[n_steps + 1] = j - 1
+      
+      n_steps += 1            
+      
+      if plot:
+        plt.imshow(self.grid.reshape(stride, stride))
+        plt.show()
+    
+    self._k_size = n_steps
+    self.log_weight = log_weight
+    self.log_counts = np.array(log_counts[:N2])
+    return n_steps
+
+  def _extensions(self, matrix, site: int, depth: int):
+    """ Counts the walks of up to depth steps from a free point, 
+    avoiding the occupied cells.
+
+    Parameters
+    -----------------------------------
+    matrix (np.array or memoryview): Flat grid with sentinel border.
+    site (int): Flat index of the point.
+    depth (int): Largest number of steps.
+
+    Output
+    -----------------------------------
+    (list): Number of walks with 0,1,...,depth steps.
+
+    """
+    counts = [1] + [0]*depth
+    if depth == 0:
+      return counts
+    
+    matrix[site] = SENTINEL
+    for offset in self.lattice.offsets:
+      if matrix[site + offset] == 0:
+        sub = self._extensions(matrix, site + offset, depth - 1)
+        for j in range(depth):
+          counts[j + 1] += sub[j]
+    matrix[site] = 0
+    return counts
+
+  @property
+  def count_estimates(self):
+    """ Returns the estimates of the number of walks of each length 
+    from this walk, their mean over walks is unbiased.
+
+    """
+    return np.exp(self.log_counts)
+
+
+class PERMSampler(SAW):
+  """ Class for the pruned-enriched Rosenbluth method (PERM). Walks 
+  are grown depth first on the grid of SAW and retracted with undo. 
+  A partial walk of length n and Rosenbluth weight W is cloned in two 
+  copies of weight W/2 when W is above c_high*Z_n/tours and it is 
+  pruned with probability 1/2 (or survives with weight 2W) when W is
+  below c_low*Z_n/tours, where Z_n is the sum of the weights of the 
+  walks of length n grown so far. The thresholds adapt as the 
+  estimates improve. Z_n/tours is an unbiased estimate of the number 
+  of walks of length n.
+
+  Parameters
+  ----------------------------------
+  N (int): Size of the latice.
+  initial_x (int): Initial x point.
+  initial_y (int): Initial y point.
+  tours (int): Number of tours grown in the constructor. (default=1000)
+  max_length (int): Largest length of the walks, if None it is N*N-1.
+                    (default=None)
+  c_high (float): Enrichment threshold factor. (default=3.)
+  c_low (float): Pruning threshold factor. (default=0.3)
+  rng (RandomBuffer, np.random.Generator, int or None): Random number 
+                    generator or seed. (default=None)
+
+  """
+  __slots__ = ('tours', 'n_tours', 'max_length', 'c_high', 'c_low', 
+               '_log_Z', '_sites')
+
+  def __init__(self, 
+               N: int, 
+               initial_x: int=0, 
+               initial_y: int=0, 
+               tours: int=1000,
+               max_length: int=None,
+               c_high: float=3.,
+               c_low: float=0.3,
+               rng=None):
+
+    self.n_tours = tours
+    self.max_length = N*N - 1 if max_length is None else max_length
+    self.c_high = c_high
+    self.c_low = c_low
+    self.tours = 0
+    self.n_walks = 0
+    self._log_Z = [-inf]*(self.max_length + 1)
+    self._sites = [0]*(self.max_length + 1)
+    super(PERMSampler, self).__init__(N,initial_x,initial_y,rng)
+
+  def _evolution(self, plot=False, debug=False):
+    """ Makes the tours of PERM.
+
+    Parameters 
+    -----------------------------------
+    plot (bool): Not used, kept for SAW. (default=False)
+    debug (bool): True if you want to debug. (default=False)
+
+
+    Outputs
+    -----------------------------------
+    (int): length of the longest walk grown. 
+
+
+    """
+    return self.sample(self.n_tours, debug=debug)
+
+  def sample(self, tours: int, debug=False):
+    """ Grows more tours and adds them to the estimates.
+
+    Parameters 
+    -----------------------------------
+    tours (int): Number of tours.
+    debug (bool): True if you want to debug. (default=False)
+
+
+    Outputs
+    -----------------------------------
+    (int): length of the longest walk grown. 
+
+
+    """
+    longest = 0
+    for _ in range(tours):
+      self.tours += 1
+      longest = max(longest, self._tour(debug=debug))
+    self.n_walks = max(self.n_walks, longest)
+    return self.n_walks
+
+  def _tour(self, debug=False):
+    """ Grows one tour, the tree of walks that come from the initial 
+    point. Every walk is retracted, so the grid is empty at the end.
+
+    Parameters 
+    -----------------------------------
+    debug (bool): True if you want to debug. (default=False)
+
+
+    Outputs
+    -----------------------------------
+    (int): length of the longest walk of the tour. 
+
+
+    """
+    stride = self.lattice.stride
+    grid, free = self._grid_view, self._free_view
+    log_Z, sites = self._log_Z, self._sites
+    max_length = self.max_length
+    
+    # Thresholds are compared with the weights in log
+    log_tours = log(self.tours)
+    log_high = log(self.c_high)
+    log_low = log(self.c_low)
+    log_2 = log(2)
+
+    # Weight and number of copies left of each walk on the stack
+    log_w = [0.]*(max_length + 1)
+    copies = [0]*(max_length + 1)
+
+    sites[0] = (int(self._x[0]) + 1)*stride + int(self._y[0]) + 1
+    n = 0
+    lw = 0.
+    longest = 0
+    enter = True
+    
+    while True:
+      if enter:
+        # New walk of length n with weight exp(lw)
+        enter = False
+        longest = max(longest, n)
+        log_Z[n] = logaddexp(log_Z[n], lw)
+        
+        k = free[sites[n]]
+        c = 0
+        if n < max_length and k > 0:
+          c = 1
+          ratio = lw - log_Z[n] + log_tours
+          
+          # Enrich
+          if ratio > log_high:
+            c = 2
+            lw -= log_2
+          
+          # Prune
+          elif ratio < log_low:
+            if self.random.uniform() < 0.5:
+              c = 0
+            else:
+              lw += log_2
+        
+        copies[n] = c
+        log_w[n] = lw
+
+      if copies[n] > 0:
+        # Grow one copy with a Rosenbluth step
+        copies[n] -= 1
+        site = sites[n]
+        k = free[site]
+        direction = self._choose_walk(grid, site, k)
+        sites[n + 1] = self._walk(grid, site, direction, debug=debug)
+        self._k[n] = k
+        lw = log_w[n] + log(k)
+        n += 1
+        enter = True
+      
+      else:
+        # Go back to the last walk with copies left
+        if n == 0:
+          break
+        n -= 1
+        self._unwalk(grid, sites[n])
+    
+    return longest
+
+  def reset(self, initial_x: int=None, initial_y: int=None):
+    """ Clears the estimates. The grid is already empty since every 
+    tour retracts its walks.
+
+    Parameters
+    -----------------------------------
+    initial_x (int): New initial x point, if None it is kept. 
+                     (default=None)
+    initial_y (int): New initial y point, if None it is kept. 
+                     (default=None)
+
+    """
+    if initial_x is not None:
+      self._x[0] = initial_x
+    if initial_y is not None:
+      self._y[0] = initial_y
+    
+    self.tours = 0
+    self._log_Z = [-inf]*(self.max_length + 1)
+    self._k_size = 0
+    self.log_weight = 0.
+    self.n_walks = 0
+
+  @property
+  def log_count_estimates(self):
+    """ Returns the log of the estimated number of walks of each 
+    length.
+
+    """
+    return np.array(self._log_Z) - log(self.tours)
+
+  @property
+  def count_estimates(self):
+    """ Returns the estimated number of walks of each length.
+
+    """
+    return np.exp(self.log_count_estimates)
+
+
+class WangLandauSAW(SAW):
+  """ Class for a flat-histogram sampler of the Self-Avoiding Walks 
+  over their length. The walk is changed by Berretti-Sokal moves on 
+  its end, with probability 1/2 one of the 4 directions is proposed 
+  as a new step and with probability 1/2 the last step is removed. 
+  Walks of length n have weight 1/g(n), and the Wang-Landau method 
+  learns log g(n) by adding log_f at each move to the current length 
+  and halving log_f when the histogram of lengths is flat. When g is
+  learned every length is visited equally and g(n)/g(0) is the 
+  number of walks of length n, the density of states.
+
+  Some lengths can not be reached, such as N*N-1 from a cell of the 
+  minority colour of an odd grid, so the histogram is only checked 
+  for flatness over the lengths that have been visited, and the 
+  lengths never visited are estimated to have no walks.
+
+  Parameters
+  ----------------------------------
+  N (int): Size of the latice.
+  initial_x (int): Initial x point.
+  initial_y (int): Initial y point.
+  max_length (int): Largest length of the walks, if None it is N*N-1.
+                    (default=None)
+  flatness (float): The histogram is flat when its minimum is larger 
+                    than flatness times its mean. (default=0.8)
+  log_f_final (float): The learning stops when log_f is smaller. 
+                       (default=1e-4)
+  check_every (int): Moves between the checks of flatness. 
+                     (default=10000)
+  max_moves (int): Largest number of moves. (default=10**8)
+  rng (RandomBuffer, np.random.Generator, int or None): Random number 
+                    generator or seed. (default=None)
+  """
+  __slots__ = ('max_length', 'flatness', 'log_f', 'log_f_final', 
+               'check_every', 'max_moves', 'moves', 'log_g', 'histogram',
+               'visited', '_sites')
+
+  def __init__(self, 
+               N: int, 
+               initial_x: int=0, 
+               initial_y: int=0, 
+               max_length: int=None,
+               flatness: float=0.8,
+               log_f_final: float=1e-4,
+               check_every: int=10000,
+               max_moves: int=10**8,
+               rng=None):
+    
+    self.max_length = N*N - 1 if max_length is None else max_length
+    self.flatness = flatness
+    self.log_f_final = log_f_final
+    self.check_every = check_every
+    self.max_moves = max_moves
+    super(WangLandauSAW, self).__init__(N,initial_x,initial_y,rng)
+
+  def _evolution(self, plot=False, debug=False):
+    """ Learns log g(n) with the Wang-Landau method.
+
+    Parameters 
+    -----------------------------------
+    plot (bool): Not used, kept for SAW. (default=False)
+    debug (bool): True if you want to debug. (default=False)
+
+
+    Outputs
+    -----------------------------------
+    (int): number of steps of the last walk. 
+
+
+    """
+    stride = self.lattice.stride
+    self._sites = [(int(self._x[0]) + 1)*stride + int(self._y[0]) + 1]
+    self.log_g = [0.]*(self.max_length + 1)
+    self.histogram = [0]*(self.max_length + 1)
+    self.visited = [False]*(self.max_length + 1)
+    self.log_f = 1.
+    self.moves = 0
+
+    while self.log_f > self.log_f_final and self.moves < self.max_moves:
+      self._moves(self.check_every, self.log_f, debug=debug)
+      
+      # Unreachable lengths are never visited and do not hold up log_f
+      self.visited = [v or h > 0 for v, h in zip(self.visited, self.histogram)]
+      histogram = [h for v, h in zip(self.visited, self.histogram) if v]
+      if min(histogram) > self.flatness*sum(histogram)/len(histogram):
+        self.log_f /= 2
+        self.histogram = [0]*(self.max_length + 1)
+
+    return len(self._sites) - 1
+
+  def refine(self, moves: int, debug=False):
+    """ Multicanonical run with the learned weights fixed, log g(n) 
+    is corrected by the log of the histogram of lengths.
+
+    Parameters 
+    -----------------------------------
+    moves (int): Number of moves.
+    debug (bool): True if you want to debug. (default=False)
+
+    """
+    self.histogram = [0]*(self.max_length + 1)
+    self._moves(moves, 0., debug=debug)
+    
+    histogram = np.array(self.histogram, dtype=float)
+    visited = histogram > 0
+    self.visited = [v or h for v, h in zip(self.visited, visited.tolist())]
+    correction = np.log(histogram[visited]/histogram[visited].mean())
+    log_g = np.array(self.log_g)
+    log_g[visited] += correction
+    self.log_g = log_g.tolist()
+    self.n_walks = len(self._sites) - 1
+
+  def _moves(self, moves: int, log_f: float, debug=False):
+    """ Makes Berretti-Sokal moves on the end of the walk, adding 
+    log_f to log g of the length after each move.
+
+    Parameters 
+    -----------------------------------
+    moves (int): Number of moves.
+    log_f (float): Modification factor of log g.
+    debug (bool): True if you want to debug. (default=False)
+
+    """
+    stride = self.lattice.stride
+    offsets = self.lattice.offsets
+    grid = self._grid_view
+    log_g, histogram = self.log_g, self.histogram
+    sites = self._sites
+    max_length = self.max_length
+    log_4 = log(4)
+    
+    n = len(sites) - 1
+    site = sites[-1]
+    for _ in range(moves):
+      u = self.random.uniform()
+      
+      # Grow in one of the 4 directions, u*8 is uniform on 0,1,2,3
+      if u < 0.5:
+        if n < max_length:
+          direction = int(u*8) + 1
+          if grid[site + offsets[direction - 1]] == 0:
+            log_a = log_4 + log_g[n] - log_g[n + 1]
+            if log_a >= 0 or self.random.uniform() < exp(log_a):
+              site = self._walk(grid, site, direction, debug=debug)
+              sites.append(site)
+              n += 1
+              i,j = divmod(site, stride)
+              self._x[n] = i - 1
+              self._y[n] = j - 1
+      
+      # Remove the last step
+      elif n > 0:
+        log_a = log_g[n] - log_g[n - 1] - log_4
+        if log_a >= 0 or self.random.uniform() < exp(log_a):
+          sites.pop()
+          site = sites[-1]
+          self._unwalk(grid, site)
+          n -= 1
+      
+      log_g[n] += log_f
+      histogram[n] += 1
+    
+    self.moves += moves
+
+  @property
+  def log_count_estimates(self):
+    """ Returns the log of the estimated number of walks of each 
+    length, normalized by the single walk of length 0.
+
+    """
+    log_counts = np.array(self.log_g) - self.log_g[0]
+    log_counts[~np.array(self.visited)] = -np.inf
+    return log_counts
+
+  @property
+  def count_estimates(self):
+    """ Returns the estimated number of walks of each length.
+
+    """
+    return np.exp(self.log_count_estimates)
+
+
+class ISAW(SAW):
+  """ Class for the Interacting Self-Avoiding Walk. The walk is grown 
+  as in SAW and it counts the contacts, the pairs of points of the 
+  walk that are neighbors on the grid but not consecutive. When the 
+  walker arrives at a cell, its occupied neighbors are the free 
+  neighbors of the empty grid minus the ones that are still free, 
+  which is the number of possible walks of the next step, so each 
+  step costs a single lookup. The cell it came from is not a contact.
+
+  The contacts m and the log weights of each length are recorded, so 
+  the walks grown once can be reweighted by exp(beta*m) for any beta, 
+  see `log_partition_estimates`.
+
+  Parameters
+  ----------------------------------
+  N (int): Size of the latice.
+  initial_x (int): Initial x point.
+  initial_y (int): Initial y point.
+  rng (RandomBuffer, np.random.Generator, int or None): Random number 
+                    generator or seed. (default=None)
+  """
+  __slots__ = ('contacts', '_m')
+
+  def __init__(self, N: int, initial_x: int=0, initial_y: int=0, rng=None):
+    self._m = np.zeros(N*N, dtype=np.int16)
+    self.contacts = 0
+    super(ISAW, self).__init__(N,initial_x,initial_y,rng)
+
+  def _evolution(self, plot=False, debug=False):
+    """ Makes the evolution of the ISAW.
+
+    Parameters 
+    -----------------------------------
+    plot (bool): Not used, kept for SAW. (default=False)
+    debug (bool): True if you want to debug. (default=False)
+
+
+    Outputs
+    -----------------------------------
+    (int): number of steps. 
+
+
+    """
+    stride = self.lattice.stride
+    site = (int(self._x[0]) + 1)*stride + int(self._y[0]) + 1
+    grid, free = self._grid_view, self._free_view
+    neighbors = memoryview(self.lattice.free)
+    n_steps = 0
+    log_weight = 0.
+    contacts = 0
+
+    k = free[site]
+    while k > 0:
+      # Log possible walks
+      self._k[n_steps] = k  
+      log_weight += log(k)
+
+      direction = self._choose_walk(grid, site, k)    
+      site = self._walk(grid, site, direction, debug=debug)      
+      i,j = divmod(site, stride)
+      self._x[n_steps + 1] = i - 1
+      self._y[n_steps + 1] = j - 1
+      n_steps += 1
+      
+      # Occupied neighbors of the new cell but the one it came from
+      k = free[site]
+      contacts += neighbors[site] - k - 1
+      self._m[n_steps] = contacts
+    
+    self._k_size = n_steps
+    self.log_weight = log_weight
+    self.contacts = contacts
+    return n_steps
+
+  @property
+  def m(self):
+    """ Returns the number of contacts at each length as a view.
+
+    """
+    return self._m[:self.n_walks + 1]
+
+  @property
+  def log_weights(self):
+    """ Returns the log of the weight 1/trial_probability of the walk 
+    at each length, next to the contacts m.
+
+    """
+    log_weights = np.zeros(self.n_walks + 1)
+    np.cumsum(np.log(self.k.astype(float)), out=log_weights[1:])
+    return log_weights
+
+  def log_boltzmann_weight(self, beta: float):
+    """ Returns the log of the weight of the walk at inverse 
+    temperature beta, log(exp(beta*m)/trial_probability).
+
+    Parameters
+    -----------------------------------
+    beta (float): Inverse temperature, the energy of a contact is -1.
+
+    Output
+    -----------------------------------
+    (float): Log of the weight.
+
+    """
+    return self.log_weight + beta*self.contacts
+
+
+def log_partition_estimates(log_weight: np.array, 
+                            contacts: np.array, 
+                            betas: np.array):
+  """ Estimates the log of the partition function of the walks of a 
+  length, Z(beta) = sum of exp(beta*m) over the walks, from walks 
+  grown without interaction. The walks that did not reach the length 
+  must be given with log_weight -inf.
+
+  Parameters
+  -----------------------------------
+  log_weight (np.array): Log of 1/trial_probability of each walk.
+  contacts (np.array): Number of contacts of each walk.
+  betas (np.array): Inverse temperatures.
+
+  Output
+  -----------------------------------
+  (np.array): Log of the estimate of Z for each beta.
+
+  """
+  log_weight = np.asarray(log_weight, dtype=float)
+  contacts = np.asarray(contacts, dtype=float)
+  betas = np.atleast_1d(np.asarray(betas, dtype=float))
+  
+  log_w = log_weight[None,:] + betas[:,None]*contacts[None,:]
+  log_max = log_w.max(axis=1, keepdims=True)
+  log_max[~np.isfinite(log_max)] = 0.
+  mean = np.exp(log_w - log_max).mean(axis=1)
+  with np.errstate(divide='ignore'):
+    return np.log(mean) + log_max[:,0]
+
+
+class TargetedSAW(SAW):
+  """ Class for the growth samplers of a class of walks, such as 
+  polygons or bridges. Each walk is grown with Rosenbluth steps among 
+  the free neighbors that are allowed by the class, so the growth 
+  does not waste steps on walks that can never be in the class. The 
+  log weight of the walk at the lengths where it is in the class is 
+  added to log_weight_sums, and the sums over samples are unbiased 
+  estimates of the number of walks of the class with each length.
+
+  The classes are given by `_allowed` and `_in_class`. Here every 
+  step is allowed and every walk is in the class, so it estimates the 
+  number of all the walks of each length.
+
+  Parameters
+  ----------------------------------
+  N (int): Size of the latice.
+  initial_x (int): Initial x point.
+  initial_y (int): Initial y point.
+  walks (int): Number of walks grown in the constructor. (default=1000)
+  max_length (int): Largest length of the walks, if None it is N*N-1.
+                    (default=None)
+  rng (RandomBuffer, np.random.Generator, int or None): Random number 
+                    generator or seed. (default=None)
+  """
+  __slots__ = ('n_samples', 'samples', 'max_length', '_log_sums', '_origin')
+
+  def __init__(self, 
+               N: int, 
+               initial_x: int=0, 
+               initial_y: int=0, 
+               walks: int=1000,
+               max_length: int=None,
+               rng=None):
+
+    self.n_samples = walks
+    self.max_length = N*N - 1 if max_length is None else max_length
+    self.samples = 0
+    self.n_walks = 0
+    self._log_sums = [-inf]*(self.max_length + 1)
+    super(TargetedSAW, self).__init__(N,initial_x,initial_y,rng)
+
+  def _evolution(self, plot=False, debug=False):
+    """ Grows the walks of the constructor.
+
+    Parameters 
+    -----------------------------------
+    plot (bool): Not used, kept for SAW. (default=False)
+    debug (bool): True if you want to debug. (default=False)
+
+
+    Outputs
+    -----------------------------------
+    (int): number of steps of the last walk. 
+
+
+    """
+    return self.sample(self.n_samples, debug=debug)
+
+  def sample(self, walks: int, debug=False):
+    """ Grows more walks and adds them to the estimates.
+
+    Parameters 
+    -----------------------------------
+    walks (int): Number of walks.
+    debug (bool): True if you want to debug. (default=False)
+
+
+    Outputs
+    -----------------------------------
+    (int): number of steps of the last walk. 
+
+
+    """
+    for _ in range(walks):
+      self.reset()
+      self.n_walks = self._grow(debug=debug)
+      self.samples += 1
+    return self.n_walks
+
+  def _grow(self, debug=False):
+    """ Grows one walk and adds its log weight at the lengths where it
+    is in the class.
+
+    Parameters 
+    -----------------------------------
+    debug (bool): True if you want to debug. (default=False)
+
+
+    Outputs
+    -----------------------------------
+    (int): number of steps. 
+
+
+    """
+    stride = self.lattice.stride
+    offsets = self.lattice.offsets
+    grid = self._grid_view
+    max_length = self.max_length
+    log_sums = self._log_sums
+    
+    # Row and column of the initial point on the bordered grid
+    self._origin = (int(self._x[0]) + 1, int(self._y[0]) + 1)
+    site = self._origin[0]*stride + self._origin[1]
+    log_weight = 0.
+    n_steps = 0
+    if self._in_class(site, n_steps):
+      log_sums[0] = logaddexp(log_sums[0], log_weight)
+
+    while n_steps < max_length:
+      allowed = [direction for direction, offset in enumerate(offsets, 1)
+                 if grid[site + offset] == 0 
+                 and self._allowed(site + offset, n_steps)]
+      if not allowed:
+        break
+
+      # Log possible walks
+      k = len(allowed)
+      self._k[n_steps] = k
+      log_weight += log(k)
+      
+      direction = self._choose_uniformly(allowed)
+      site = self._walk(grid, site, direction, debug=debug)
+      i,j = divmod(site, stride)
+      self._x[n_steps + 1] = i - 1
+      self._y[n_steps + 1] = j - 1
+      n_steps += 1
+
+      if self._in_class(site, n_steps):
+        log_sums[n_steps] = logaddexp(log_sums[n_steps], log_weight)
+
+    self._k_size = n_steps
+    self.log_weight = log_weight
+    return n_steps
+
+  def _allowed(self, neighbor: int, n_steps: int):
+    """ Check if the walk of n_steps may step to a free neighbor.
+
+    Parameters 
+    -----------------------------------
+    neighbor (int): Flat index of the neighbor.
+    n_steps (int): Number of steps before the step.
+
+
+    Outputs
+    -----------------------------------
+    (bool): True if the step is allowed. 
+
+
+    """
+    return True
+
+  def _in_class(self, site: int, n_steps: int):
+    """ Check if the walk of n_steps that ends at site is in the class.
+    It is called once for each length, in order.
+
+    Parameters 
+    -----------------------------------
+    site (int): Flat index of the end of the walk.
+    n_steps (int): Number of steps of the walk.
+
+
+    Outputs
+    -----------------------------------
+    (bool): True if the walk is in the class. 
+
+
+    """
+    return True
+
+  @property
+  def log_count_estimates(self):
+    """ Returns the log of the estimated number of walks of the class 
+    with each length.
+
+    """
+    return np.array(self._log_sums) - log(max(self.samples, 1))
+
+  @property
+  def count_estimates(self):
+    """ Returns the estimated number of walks of the class with each 
+    length.
+
+    """
+    return np.exp(self.log_count_estimates)
+
+
+class PolygonSAW(TargetedSAW):
+  """ Class for the estimates of the number of walks that end next to 
+  the initial point, which close into self-avoiding polygons. A walk 
+  of n >= 3 steps that ends next to the initial point is a polygon of 
+  n+1 edges through it, and each polygon is found in its 2 
+  orientations. The target max_length must be given: a step is only 
+  allowed to a neighbor from which the initial point can still be 
+  reached by max_length, so the growth is steered back to it and the
+  weight of walks that can not close is never spent. The bound holds 
+  for every walk that closes by max_length, so the estimates of all 
+  the shorter lengths are unbiased too, but they are best at lengths 
+  close to max_length.
+
+  Parameters
+  ----------------------------------
+  N (int): Size of the latice.
+  initial_x (int): Initial x point.
+  initial_y (int): Initial y point.
+  walks (int): Number of walks grown in the constructor. (default=1000)
+  max_length (int): Target length of the walks, it is required.
+  rng (RandomBuffer, np.random.Generator, int or None): Random number 
+                    generator or seed. (default=None)
+  """
+  __slots__ = ()
+
+  def __init__(self, 
+               N: int, 
+               initial_x: int=0, 
+               initial_y: int=0, 
+               walks: int=1000,
+               max_length: int=None,
+               rng=None):
+    
+    assert max_length is not None, "PolygonSAW needs a target max_length."
+    super(PolygonSAW, self).__init__(N, initial_x, initial_y, walks, 
+                                     max_length, rng)
+
+  def _distance(self, site: int):
+    """ Returns the distance from a site to the initial point.
+
+    """
+    i,j = divmod(site, self.lattice.stride)
+    return abs(i - self._origin[0]) + abs(j - self._origin[1])
+
+  def _allowed(self, neighbor: int, n_steps: int):
+    """ A neighbor at distance d needs d - 1 more steps to end next to
+    the initial point.
+
+    """
+    return self._distance(neighbor) <= self.max_length - n_steps
+
+  def _in_class(self, site: int, n_steps: int):
+    """ The walk closes into a polygon when it ends next to the 
+    initial point after at least 3 steps.
+
+    """
+    return n_steps >= 3 and self._distance(site) == 1
+
+
+class BridgeSAW(TargetedSAW):
+  """ Class for the estimates of the number of bridges, the walks whose 
+  points after the first one are below the initial point, x > x_0, 
+  and whose last point is the lowest one, x_n >= x_i. Steps are only 
+  allowed below the row of the initial point, and the weight of a 
+  walk is added at every length where its last point is the lowest.
+
+  Parameters
+  ----------------------------------
+  N (int): Size of the latice.
+  initial_x (int): Initial x point.
+  initial_y (int): Initial y point.
+  walks (int): Number of walks grown in the constructor. (default=1000)
+  max_length (int): Largest length of the walks, if None it is N*N-1.
+                    (default=None)
+  rng (RandomBuffer, np.random.Generator, int or None): Random number 
+                    generator or seed. (default=None)
+  """
+  __slots__ = ('_lowest',)
+
+  def _allowed(self, neighbor: int, n_steps: int):
+    """ Only the rows below the initial point are allowed.
+
+    """
+    return neighbor//self.lattice.stride > self._origin[0]
+
+  def _in_class(self, site: int, n_steps: int):
+    """ The walk is a bridge when its last point is the lowest one.
+
+    """
+    row = site//self.lattice.stride
+    if n_steps == 0 or row >= self._lowest:
+      self._lowest = row
+      return True
+    return False
+
+
+def grid_symmetries(N: int):
+  """ Returns the 8 symmetries of the NxN grid, the rotations and 
+  reflections of the square, as functions of the points (i,j). They 
+  also work on arrays of points.
+
+  Parameters
+  -----------------------------------
+  N (int): Size of the latice.
+
+  Outputs
+  -----------------------------------
+  (tuple): Functions that map (i,j) to the transformed point.
+
+  """
+  m = N - 1
+  return (lambda i, j: (i, j),
+          lambda i, j: (j, m - i),
+          lambda i, j: (m - i, m - j),
+          lambda i, j: (m - j, i),
+          lambda i, j: (m - i, j),
+          lambda i, j: (i, m - j),
+          lambda i, j: (j, i),
+          lambda i, j: (m - j, m - i))
+
+
+@lru_cache(maxsize=64)
+def start_cell_orbits(N: int):
+  """ Splits the cells of the NxN grid in the orbits of the 8 
+  symmetries of the square. Walks from cells of the same orbit are 
+  images of each other, so only one cell of each orbit, about N*N/8 
+  of them, has to be sampled. The result is cached by N and must not 
+  be modified.
+
+  Parameters
+  -----------------------------------
+  N (int): Size of the latice.
+
+  Outputs
+  -----------------------------------
+  (np.array): Representative cell (i,j) of each orbit, with shape (K,2).
+  (np.array): Number of cells of each orbit, with shape (K,).
+  (np.array): Orbit of each cell, with shape (N,N).
+
+  """
+  i, j = np.indices((N, N))
+  
+  # The representative is the smallest image as a flat index
+  images = [np.ravel_multi_index(g(i, j), (N, N)) for g in grid_symmetries(N)]
+  representative = np.min(images, axis=0)
+  
+  flat, orbit, multiplicity = np.unique(representative, return_inverse=True,
+                                        return_counts=True)
+  cells = np.stack(np.unravel_index(flat, (N, N)), axis=1)
+  orbit = orbit.reshape(N, N)
+  for array in (cells, multiplicity, orbit):
+    array.flags.writeable = False
+  return cells, multiplicity, orbit
+
+
+class ExactSAW(SAW):
+  """ Class for the exact enumeration of the Self-Avoiding Walks 
+  from the initial point. The walks are enumerated depth first on the 
+  grid of SAW, taking steps and undoing them. The symmetries of the 
+  grid that keep the initial point fixed map the walks that start 
+  with a first step onto the walks that start with its image, so 
+  only one first step of each class is enumerated. This is 
+  exponential in N*N and meant for small grids.
+
+  Parameters
+  ----------------------------------
+  N (int): Size of the latice.
+  initial_x (int): Initial x point.
+  initial_y (int): Initial y point.
+  max_length (int): Largest length of the walks, if None it is N*N-1.
+                    (default=None)
+  """
+  __slots__ = ('max_length', 'counts', 'trapped_counts')
+
+  def __init__(self, 
+               N: int, 
+               initial_x: int=0, 
+               initial_y: int=0, 
+               max_length: int=None):
+    
+    self.max_length = N*N - 1 if max_length is None else max_length
+    super(ExactSAW, self).__init__(N,initial_x,initial_y)
+
+  def _first_steps(self):
+    """ Groups the first steps by the symmetries of the grid that 
+    keep the initial point fixed.
+
+    Outputs
+    -----------------------------------
+    (list): Pairs of direction of a first step and the number of 
+            first steps equivalent to it.
+
+    """
+    N = self.lattice.N
+    start = (int(self._x[0]), int(self._y[0]))
+    stabilizer = [g for g in grid_symmetries(N) if g(*start) == start]
+    
+    # Directions 1: Left, 2: Right, 3: Up, 4: Down
+    steps = {(start[0], start[1] - 1): 1, (start[0], start[1] + 1): 2,
+             (start[0] - 1, start[1]): 3, (start[0] + 1, start[1]): 4}
+    steps = {p: d for p, d in steps.items() if 0 <= min(p) and max(p) < N}
+    
+    classes = []
+    seen = set()
+    for point, direction in steps.items():
+      if point in seen:
+        continue
+      orbit = {g(*point) for g in stabilizer}
+      seen |= orbit
+      classes.append((direction, len(orbit)))
+    return classes
+
+  def _evolution(self, plot=False, debug=False):
+    """ Enumerates the walks.
+
+    Parameters 
+    -----------------------------------
+    plot (bool): Not used, kept for SAW. (default=False)
+    debug (bool): True if you want to debug. (default=False)
+
+
+    Outputs
+    -----------------------------------
+    (int): length of the longest walk. 
+
+
+    """
+    stride = self.lattice.stride
+    offsets = self.lattice.offsets
+    grid, free = self._grid_view, self._free_view
+    max_length = self.max_length
+    start = (int(self._x[0]) + 1)*stride + int(self._y[0]) + 1
+    
+    self.counts = np.zeros(max_length + 1, dtype=np.int64)
+    self.trapped_counts = np.zeros(max_length + 1, dtype=np.int64)
+    self.counts[0] = 1
+    if free[start] == 0:
+      self.trapped_counts[0] = 1
+    if max_length == 0:
+      return 0
+
+    # Site and next direction to try of each walk on the stack
+    sites = [0]*(max_length + 1)
+    next_direction = [0]*(max_length + 1)
+    
+    for first, multiplicity in self._first_steps():
+      counts = [0]*(max_length + 1)
+      trapped = [0]*(max_length + 1)
+      
+      sites[0] = start
+      sites[1] = self._walk(grid, start, first, debug=debug)
+      next_direction[1] = 0
+      counts[1] = 1
+      trapped[1] = free[sites[1]] == 0
+      n = 1
+      
+      while True:
+        site = sites[n]
+        d = next_direction[n]
+        if d < 4 and n < max_length:
+          next_direction[n] = d + 1
+          if grid[site + offsets[d]] == 0:
+            n += 1
+            sites[n] = self._walk(grid, site, d + 1, debug=debug)
+            next_direction[n] = 0
+            counts[n] += 1
+            trapped[n] += free[sites[n]] == 0
+        
+        else:
+          # Go back, the first step is undone at the end
+          n -= 1
+          self._unwalk(grid, sites[n])
+          if n == 0:
+            break
+      
+      self.counts += multiplicity*np.array(counts, dtype=np.int64)
+      self.trapped_counts += multiplicity*np.array(trapped, dtype=np.int64)
+    
+    return int(np.flatnonzero(self.counts)[-1])
+
+  def reset(self, initial_x: int=None, initial_y: int=None):
+    """ Clears the counts and moves the initial point, `run` then 
+    enumerates the walks again. The grid is already empty since 
+    every walk is undone.
+
+    Parameters
+    -----------------------------------
+    initial_x (int): New initial x point, if None it is kept. 
+                     (default=None)
+    initial_y (int): New initial y point, if None it is kept. 
+                     (default=None)
+
+    """
+    if initial_x is not None:
+      self._x[0] = initial_x
+    if initial_y is not None:
+      self._y[0] = initial_y
+    self.counts = None
+    self.trapped_counts = None
+    self.n_walks = 0
+
+
+class FrontierSAW():
+  """ Class for the exact counting of the Self-Avoiding Walks from a 
+  corner of the NxN grid with frontier-based dynamic programming 
+  (transfer matrix). The vertices are processed row by row and the 
+  state is the set of N+1 edges that cross the frontier between the 
+  processed and the unprocessed vertices. Each crossing edge is 
+  labeled by the path fragment it belongs to, fragments that are open 
+  at both ends share a label, the fragment that ends at the initial 
+  point is labeled S and the fragment that ends at the other end of 
+  the walk is labeled T. Each walk from the corner is a simple path 
+  with the corner as one of its ends, so counting these paths counts 
+  the walks. The memory is bounded by the number of frontier states.
+
+  The counts of each state are kept as one Python integer, where the 
+  count of the walks of length n is stored in the bits 
+  [n*bits, (n+1)*bits), so adding a step is a shift.
+
+  Parameters
+  ----------------------------------
+  N (int): Size of the latice.
+  initial_x (int): Initial x point, it must be a corner.
+  initial_y (int): Initial y point, it must be a corner.
+  """
+  # Labels of the fragments that end at the initial point and at the 
+  # other end of the walk
+  S = -1
+  T = -2
+
+  def __init__(self, N: int, initial_x: int=0, initial_y: int=0):
+    assert initial_x in (0, N - 1) and initial_y in (0, N - 1), \
+           "The initial point must be a corner of the grid."
+    self.N = N
+    self.initial_x = initial_x
+    self.initial_y = initial_y
+    
+    # There are at most 4*3**(n-1) walks of length n < 4**n
+    self.bits = 2*N*N + 2
+    self.max_states = 0
+    
+    # The corners are equivalent, so the walks start at (0,0)
+    self.counts = self._evolution()
+
+  def _evolution(self):
+    """ Runs the dynamic programming over all vertices.
+
+    Outputs
+    -----------------------------------
+    (np.array): Number of walks of each length as Python integers.
+
+    """
+    N, bits = self.N, self.bits
+    S, T = self.S, self.T
+    
+    states = {(0,)*(N + 1): 1}
+    walks = 0
+
+    for i in range(N):
+      for j in range(N):
+        new_states = defaultdict(int)
+        start = i == 0 and j == 0
+        down = i < N - 1
+        right = j < N - 1
+
+        for plugs, value in states.items():
+          up, left = plugs[j], plugs[N]
+          p = list(plugs)
+          p[j] = 0
+          p[N] = 0
+          has_T = T in plugs
+
+          if up == 0 and left == 0:
+            # Vertex not used, the initial point is always used
+            if not start:
+              self._add(new_states, p, value)
+            
+            # End of the walk with one edge
+            if start or not has_T:
+              tag = S if start else T
+              if down:
+                self._add(new_states, p, value << bits, j, tag)
+              if right:
+                self._add(new_states, p, value << bits, N, tag)
+            
+            # New fragment going down and right
+            if not start and down and right:
+              self._add(new_states, p, value << 2*bits, j, N + 2, N, N + 2)
+
+          elif up == 0 or left == 0:
+            a = up or left
+            
+            # The fragment goes on
+            if down:
+              self._add(new_states, p, value << bits, j, a)
+            if right:
+              self._add(new_states, p, value << bits, N, a)
+            
+            # The fragment ends at this vertex, the other end of the walk
+            if has_T:
+              continue
+            if a == S:
+              if not any(p):
+                walks += value
+            elif a > 0:
+              self._add(new_states, [T if v == a else v for v in p], value)
+
+          else:
+            a, b = up, left
+            if a > 0 and b > 0:
+              # Joining both ends of one fragment makes a cycle
+              if a != b:
+                self._add(new_states, [a if v == b else v for v in p], value)
+            elif a > 0 or b > 0:
+              tag, label = (a, b) if a < 0 else (b, a)
+              self._add(new_states, [tag if v == label else v for v in p], 
+                        value)
+            elif a != b and not any(p):
+              # S meets T and the walk is complete
+              walks += value
+        
+        states = new_states
+        self.max_states = max(self.max_states, len(states))
+
+    mask = (1 << bits) - 1
+    counts = np.array([(walks >> n*bits) & mask for n in range(N*N)], 
+                      dtype=object)
+    counts[0] = 1
+    return counts
+
+  @staticmethod
+  def _add(states: dict, plugs: list, value: int, *changes):
+    """ Adds the value to a state with the labels relabeled by order 
+    of appearance.
+
+    Parameters
+    -----------------------------------
+    states (dict): States and their values.
+    plugs (list): Labels of the frontier edges.
+    value (int): Packed counts.
+    changes (int): Pairs of position and new label.
+
+    """
+    plugs = list(plugs)
+    for position, label in zip(changes[::2], changes[1::2]):
+      plugs[position] = label
+    
+    relabel = {}
+    for position, label in enumerate(plugs):
+      if label > 0:
+        plugs[position] = relabel.setdefault(label, len(relabel) + 1)
+    states[tuple(plugs)] += value
+
+
+@lru_cache(maxsize=64)
+def bit_layout(N: int, d: int=2):
+  """ Assigns one bit to each cell of the grid of side N in d 
+  dimensions, the cell (i,j) without the border uses the bit i*N + j,
+  and so on for more dimensions. Every sentinel of the bordered grid 
+  shares the extra bit N**d, which is always set. The result is 
+  cached by N and d and must not be modified.
+
+  Parameters
+  -----------------------------------
+  N (int): Size of the latice.
+  d (int): Dimension of the lattice. (default=2)
+
+  Outputs
+  -----------------------------------
+  (np.array): Bit of each flat site of the bordered grid.
+
+  """
+  stride = N + 2
+  bit = np.full((stride,)*d, N**d, dtype=np.int64)
+  bit[(slice(1, -1),)*d] = np.arange(N**d).reshape((N,)*d)
+  bit = bit.ravel()
+  bit.flags.writeable = False
+  return bit
+
+
+class BitboardOccupancy():
+  """ Occupancy of M walkers on a grid with at most 64 cells, such as 
+  NxN with N <= 8, where each walker is a single uint64 bitboard. A 
+  sentinel site has an empty mask, so it is always seen as occupied.
+
+  Parameters
+  ----------------------------------
+  N (int): Size of the latice.
+  M (int): Number of walkers.
+  d (int): Dimension of the lattice. (default=2)
+  """
+  def __init__(self, N: int, M: int, d: int=2):
+    assert N**d <= 64, "Bitboards only fit grids with at most 64 cells."
+    bit = bit_layout(N, d)
+    self.N = N
+    self.d = d
+    self.mask = np.where(bit < N**d, 
+                         np.left_shift(np.uint64(1), 
+                                       np.minimum(bit, 63).astype(np.uint64)), 
+                         np.uint64(0))
+    self.board = np.zeros(M, dtype=np.uint64)
+
+  def occupied(self, rows: np.array, sites: np.array):
+    """ Check if sites are occupied.
+
+    Parameters
+    -----------------------------------
+    rows (np.array): Walkers, with shape (m,).
+    sites (np.array): Flat sites of the bordered grid, with shape (m,...).
+
+    Output
+    -----------------------------------
+    (np.array): True where the site is occupied.
+
+    """
+    mask = self.mask[sites]
+    board = self.board[rows].reshape(rows.shape + (1,)*(sites.ndim - 1))
+    return (board & mask) == mask
+
+  def occupy(self, rows: np.array, sites: np.array):
+    """ Occupy one site for each walker.
+
+    Parameters
+    -----------------------------------
+    rows (np.array): Walkers, with shape (m,).
+    sites (np.array): Flat sites of the bordered grid, with shape (m,).
+
+    """
+    self.board[rows] |= self.mask[sites]
+
+  def take(self, rows: np.array):
+    """ Replaces the occupancy by the one of the given walkers, 
+    used when walkers are resampled.
+
+    Parameters
+    -----------------------------------
+    rows (np.array): Walker copied to each position.
+
+    """
+    self.board = self.board[rows]
+
+  def unpack(self):
+    """ Returns the occupancy as a boolean (M,N,N) array, with one 
+    more axis of size N for each extra dimension.
+
+    """
+    shifts = np.arange(self.N**self.d, dtype=np.uint64)
+    cells = (self.board[:,None] >> shifts) & np.uint64(1)
+    return cells.astype(bool).reshape((-1,) + (self.N,)*self.d)
+
+
+class PackedOccupancy():
+  """ Occupancy of M walkers on a NxN grid, where each walker is a 
+  packed array of N*N + 1 bits. The last bit is shared by all the 
+  sentinel sites and it is always set. Grids in d dimensions use 
+  N**d + 1 bits.
+
+  Parameters
+  ----------------------------------
+  N (int): Size of the latice.
+  M (int): Number of walkers.
+  d (int): Dimension of the lattice. (default=2)
+  """
+  def __init__(self, N: int, M: int, d: int=2):
+    bit = bit_layout(N, d)
+    cells = N**d
+    self.N = N
+    self.d = d
+    self.byte = bit >> 3
+    self.shift = (bit & 7).astype(np.uint8)
+    self.bits = np.zeros((M, cells//8 + 1), dtype=np.uint8)
+    self.bits[:, cells >> 3] = 1 << (cells & 7)
+
+  def occupied(self, rows: np.array, sites: np.array):
+    """ Check if sites are occupied.
+
+    Parameters
+    -----------------------------------
+    rows (np.array): Walkers, with shape (m,).
+    sites (np.array): Flat sites of the bordered grid, with shape (m,...).
+
+    Output
+    -----------------------------------
+    (np.array): True where the site is occupied.
+
+    """
+    rows = rows.reshape(rows.shape + (1,)*(sites.ndim - 1))
+    return ((self.bits[rows, self.byte[sites]] >> self.shift[sites]) & 1) == 1
+
+  def occupy(self, rows: np.array, sites: np.array):
+    """ Occupy one site for each walker.
+
+    Parameters
+    -----------------------------------
+    rows (np.array): Walkers, with shape (m,).
+    sites (np.array): Flat sites of the bordered grid, with shape (m,).
+
+    """
+    self.bits[rows, self.byte[sites]] |= np.left_shift(1, self.shift[sites], 
+                                                       dtype=np.uint8)
+
+  def take(self, rows: np.array):
+    """ Replaces the occupancy by the one of the given walkers, 
+    used when walkers are resampled.
+
+    Parameters
+    -----------------------------------
+    rows (np.array): Walker copied to each position.
+
+    """
+    self.bits = self.bits[rows]
+
+  def unpack(self):
+    """ Returns the occupancy as a boolean (M,N,N) array, with one 
+    more axis of size N for each extra dimension.
+
+    """
+    cells = np.unpackbits(self.bits, axis=1, bitorder='little')
+    cells = cells[:, :self.N**self.d].astype(bool)
+    return cells.reshape((-1,) + (self.N,)*self.d)
+
+
+class SAWBatch():
+  """ Class for a batch of Self-Avoiding Walks that are grown 
+  simultaneously. Every step advances all live walkers at once.
+  The occupancy is bit-packed, a uint64 bitboard per walker for 
+  N <= 8 and a packed bit array for larger grids.
+
+  The walkers move on the grid of the lattice, which can be a grid 
+  in d dimensions made by `hypercubic_lattice`, `triangular_lattice`
+  or `honeycomb_lattice`. Each step gathers the neighbors of every
+  walker from the table of the lattice, so it does not depend on the 
+  lattice. On grids in d > 2 dimensions the coordinates of the 
+  initial point after the first two are 0.
+
+  Parameters
+  ----------------------------------
+  N (int): Size of the latice.
+  M (int): Number of walkers.
+  initial_x (int): Initial x point.
+  initial_y (int): Initial y point.
+  rng (np.random.Generator, int or None): Random number generator or 
+                                          seed. (default=None)
+  lattice (Lattice): Description of the grid, if None it is the NxN 
+                     square lattice. (default=None)
+  """
+  def __init__(self, N: int, M: int, initial_x: int=0, initial_y: int=0, 
+               rng=None, lattice: Lattice=None):
+    self.N = N
+    self.M = M
+    self.rng = np.random.default_rng(rng)
+    self.lattice = square_lattice(N) if lattice is None else lattice
+    d = self.lattice.d
+    assert self.lattice.N == N, "The lattice must have size N."
+
+    # Bit-packed occupancy of each walker
+    if N**d <= 64:
+      self.occupancy = BitboardOccupancy(N, M, d)
+    else:
+      self.occupancy = PackedOccupancy(N, M, d)
+    
+    # Position of each walker as a flat index on the bordered grid
+    initial = (initial_x, initial_y) + (0,)*(d - 2)
+    self.position = np.full(M, self.lattice.site(initial), dtype=np.int64)
+    
+    # Mark the initial point as visited
+    self.occupancy.occupy(np.arange(M), self.position)
+    
+    # Running log of the weight 1/trial_probability for each walker
+    self.log_weight = np.zeros(M)
+    self.n_walks = np.zeros(M, dtype=np.int64)
+
+    self.n_walks = self._evolution()
+
+  def _evolution(self):
+    """ Makes the evolution of all walkers until every one of 
+    them is trapped.
+
+    Outputs
+    -----------------------------------
+    (np.array): number of steps of each walker.
+
+    """
+    rows = np.arange(self.M)
+    while rows.size > 0:
+      k = self._step(rows)
+      
+      # Walkers without possible walks are terminated
+      rows = rows[k > 0]
+    
+    return self.n_walks
+
+  def _step(self, rows: np.array):
+    """ Makes one step of the given walkers. Walkers without possible
+    walks do not move.
+
+    Parameters
+    -----------------------------------
+    rows (np.array): Walkers to move.
+
+    Outputs
+    -----------------------------------
+    (np.array): number of possible walks of each walker.
+
+    """
+    # Check possible walks for every walker, the sentinel 
+    # border is occupied so there is no bounds check
+    neighbors = self.lattice.neighbors[self.position[rows]]
+    possible = ~self.occupancy.occupied(rows, neighbors)
+    k = possible.sum(axis=1)
+
+    alive = k > 0
+    rows, possible, k_alive = rows[alive], possible[alive], k[alive]
+    neighbors = neighbors[alive]
+
+    # Choose uniformly one of the possible walks
+    choice = (self.rng.random(rows.size)*k_alive).astype(np.int64)
+    direction = (possible.cumsum(axis=1) > choice[:,None]).argmax(axis=1)
+    
+    new = neighbors[np.arange(rows.size), direction]
+    self.occupancy.occupy(rows, new)
+    self.position[rows] = new
+    
+    self.log_weight[rows] += np.log(k_alive)
+    self.n_walks[rows] += 1
+    return k
+
+  @property
+  def grid(self):
+    """ Returns the visited cells of each walker as a (M,N,N) array,
+    with one more axis of size N for each extra dimension.
+
+    """
+    return self.occupancy.unpack()
+
+  @property
+  def number_of_walks(self):
+    """ Returns the number of walks of each walker.
+
+    """
+    return self.n_walks
+
+  @property
+  def trial_probability(self):
+    """ Return the trial probability function of each walker.
+
+    """
+    return np.exp(self.log_trial_probability)
+
+  @property
+  def log_trial_probability(self):
+    """ Return the log of the trial probability function of each walker.
+
+    """
+    return -self.log_weight
+
+
+def _inverse_cdf(weights: np.array, u: np.array):
+  """ Finds the index of each uniform number on the cumulative 
+  distribution of the weights.
+
+  Parameters
+  -----------------------------------
+  weights (np.array): Normalized weights.
+  u (np.array): Sorted or unsorted uniform numbers in [0,1).
+
+  Output
+  -----------------------------------
+  (np.array): Indices.
+
+  """
+  indices = np.searchsorted(np.cumsum(weights), u, side='right')
+  return np.minimum(indices, weights.size - 1)
+
+
+def multinomial_resampling(weights: np.array, rng: np.random.Generator):
+  """ Draws len(weights) indices independently with probability 
+  given by the weights.
+
+  Parameters
+  -----------------------------------
+  weights (np.array): Normalized weights.
+  rng (np.random.Generator): Random number generator.
+
+  Output
+  -----------------------------------
+  (np.array): Indices of the resampled walkers.
+
+  """
+  return _inverse_cdf(weights, rng.random(weights.size))
+
+
+def stratified_resampling(weights: np.array, rng: np.random.Generator):
+  """ Draws one uniform number on each of the len(weights) strata 
+  of [0,1).
+
+  Parameters
+  -----------------------------------
+  weights (np.array): Normalized weights.
+  rng (np.random.Generator): Random number generator.
+
+  Output
+  -----------------------------------
+  (np.array): Indices of the resampled walkers.
+
+  """
+  P = weights.size
+  return _inverse_cdf(weights, (rng.random(P) + np.arange(P))/P)
+
+
+def systematic_resampling(weights: np.array, rng: np.random.Generator):
+  """ Uses a single uniform number shifted to each of the len(weights) 
+  strata of [0,1).
+
+  Parameters
+  -----------------------------------
+  weights (np.array): Normalized weights.
+  rng (np.random.Generator): Random number generator.
+
+  Output
+  -----------------------------------
+  (np.array): Indices of the resampled walkers.
+
+  """
+  P = weights.size
+  return _inverse_cdf(weights, (rng.random() + np.arange(P))/P)
+
+
+def residual_resampling(weights: np.array, rng: np.random.Generator):
+  """ Keeps floor(P*w) copies of each walker and draws the rest with 
+  multinomial resampling on the residual weights.
+
+  Parameters
+  -----------------------------------
+  weights (np.array): Normalized weights.
+  rng (np.random.Generator): Random number generator.
+
+  Output
+  -----------------------------------
+  (np.array): Indices of the resampled walkers.
+
+  """
+  P = weights.size
+  copies = np.floor(P*weights).astype(np.int64)
+  indices = np.repeat(np.arange(P), copies)
+  
+  n_left = P - indices.size
+  if n_left > 0:
+    residual = P*weights - copies
+    residual /= residual.sum()
+    indices = np.concatenate((indices, 
+                              _inverse_cdf(residual, rng.random(n_left))))
+  return indices
+
+
+RESAMPLING = {'multinomial': multinomial_resampling,
+              'stratified': stratified_resampling,
+              'systematic': systematic_resampling,
+              'residual': residual_resampling}
+
+
+class SMCSampler(SAWBatch):
+  """ Class for Sequential Monte Carlo of Self-Avoiding Walks. A 
+  population of P walks is grown one step at a time with Rosenbluth 
+  steps and trapped walks get weight 0. When the effective sample 
+  size drops below ess_threshold*P the walks are resampled. The 
+  normalizing constant of each length, the number of walks, is 
+  estimated without bias as the product of the mean weights between 
+  resamplings.
+
+  Parameters
+  ----------------------------------
+  N (int): Size of the latice.
+  P (int): Number of walks of the population.
+  initial_x (int): Initial x point.
+  initial_y (int): Initial y point.
+  max_length (int): Largest length of the walks, if None it is the 
+                    number of cells minus 1. (default=None)
+  ess_threshold (float): Fraction of P below which the population 
+                         is resampled. (default=0.5)
+  resampling (str): 'multinomial', 'systematic', 'residual' or 
+                    'stratified'. (default='systematic')
+  rng (np.random.Generator, int or None): Random number generator or 
+                                          seed. (default=None)
+  lattice (Lattice): Description of the grid, if None it is the NxN 
+                     square lattice. (default=None)
+  """
+  def __init__(self, 
+               N: int, 
+               P: int, 
+               initial_x: int=0, 
+               initial_y: int=0,
+               max_length: int=None,
+               ess_threshold: float=0.5,
+               resampling: str='systematic',
+               rng=None,
+               lattice: Lattice=None):
+    
+    assert resampling in RESAMPLING, f"Resampling must be one of {list(RESAMPLING)}."
+    d = 2 if lattice is None else lattice.d
+    self.max_length = N**d - 1 if max_length is None else max_length
+    self.ess_threshold = ess_threshold
+    self.resampling = resampling
+    super(SMCSampler, self).__init__(N, P, initial_x, initial_y, rng, lattice)
+
+  def _evolution(self):
+    """ Grows the population until max_length or until every walk 
+    is trapped.
+
+    Outputs
+    -----------------------------------
+    (np.array): number of steps of each walk.
+
+    """
+    P = self.M
+    resample = RESAMPLING[self.resampling]
+    
+    self.log_Z = np.full(self.max_length + 1, -np.inf)
+    self.log_Z[0] = 0.
+    self.ess = np.zeros(self.max_length + 1)
+    self.ess[0] = P
+    self.resampled = []
+    
+    # Log of the estimate at the last resampling
+    log_offset = 0.
+
+    for n in range(1, self.max_length + 1):
+      rows = np.flatnonzero(self.log_weight > -np.inf)
+      if rows.size == 0:
+        break
+      
+      # Trapped walks can not reach the length n
+      k = self._step(rows)
+      self.log_weight[rows[k == 0]] = -np.inf
+      
+      log_max = self.log_weight.max()
+      if log_max == -np.inf:
+        break
+      w = np.exp(self.log_weight - log_max)
+      
+      self.log_Z[n] = log_offset + log_max + log(w.mean())
+      self.ess[n] = w.sum()**2/(w**2).sum()
+
+      if self.ess[n] < self.ess_threshold*P:
+        self._resample(resample(w/w.sum(), self.rng))
+        log_offset = self.log_Z[n]
+        self.resampled.append(n)
+    
+    return self.n_walks
+
+  def _resample(self, rows: np.array):
+    """ Replaces the population by copies of the given walks, 
+    with equal weights.
+
+    Parameters
+    -----------------------------------
+    rows (np.array): Walk copied to each position.
+
+    """
+    self.occupancy.take(rows)
+    self.position = self.position[rows]
+    self.n_walks = self.n_walks[rows]
+    self.log_weight = np.zeros(self.M)
+
+  @property
+  def log_count_estimates(self):
+    """ Returns the log of the estimated number of walks of each 
+    length.
+
+    """
+    return self.log_Z
+
+  @property
+  def count_estimates(self):
+    """ Returns the estimated number of walks of each length.
+
+    """
+    return np.exp(self.log_Z)
+
+
+class StartCellSampler():
+  """ Class for the Rosenbluth estimates of the walks from every cell 
+  of the NxN grid. Only one cell of each orbit of the symmetries of 
+  the square is sampled, see `start_cell_orbits`, each with a batch 
+  of M walkers grown by SAWBatch. The estimates are expanded back to 
+  every cell with the orbit of the cell, and the ones of the whole 
+  grid are summed with the sizes of the orbits.
+
+  Parameters
+  ----------------------------------
+  N (int): Size of the latice.
+  M (int): Number of walkers from each representative cell.
+  rng (np.random.Generator, int or None): Random number generator or 
+                                          seed. (default=None)
+  """
+  def __init__(self, N: int, M: int, rng=None):
+    self.N = N
+    self.M = M
+    self.rng = np.random.default_rng(rng)
+    self.cells, self.multiplicity, self.orbit = start_cell_orbits(N)
+    
+    # Log of the estimated number of walks that are trapped with each 
+    # length and mean length, for each representative cell
+    self.log_trapped_counts = np.full((len(self.cells), N*N), -np.inf)
+    self.mean_length = np.zeros(len(self.cells))
+    
+    for index, (i, j) in enumerate(self.cells):
+      batch = SAWBatch(N, M, int(i), int(j), rng=self.rng)
+      self._add(index, batch.n_walks, batch.log_weight)
+
+  def _add(self, index: int, n_walks: np.array, log_weight: np.array):
+    """ Keeps the estimates of a representative cell.
+
+    Parameters
+    -----------------------------------
+    index (int): Orbit of the cell.
+    n_walks (np.array): Number of steps of each walker.
+    log_weight (np.array): Log of 1/trial_probability of each walker.
+
+    """
+    for n in np.unique(n_walks):
+      w = log_weight[n_walks == n]
+      log_max = w.max()
+      self.log_trapped_counts[index, n] = (log_max + 
+                                           log(np.exp(w - log_max).sum()/self.M))
+    self.mean_length[index] = n_walks.mean()
+
+  @property
+  def trapped_counts_grid(self):
+    """ Returns the estimated number of walks from each cell that are 
+    trapped with each length, with shape (N,N,N*N).
+
+    """
+    return np.exp(self.log_trapped_counts[self.orbit])
+
+  @property
+  def mean_length_grid(self):
+    """ Returns the mean length of the walks from each cell, with 
+    shape (N,N).
+
+    """
+    return self.mean_length[self.orbit]
+
+  @property
+  def log_total_trapped_counts(self):
+    """ Returns the log of the estimated number of trapped walks of 
+    each length summed over every initial cell.
+
+    """
+    log_counts = self.log_trapped_counts + np.log(self.multiplicity)[:,None]
+    log_max = log_counts.max(axis=0)
+    finite = np.isfinite(log_max)
+    total = np.full(log_max.shape, -np.inf)
+    total[finite] = log_max[finite] + np.log(
+                    np.exp(log_counts[:,finite] - log_max[finite]).sum(axis=0))
+    return total
+
+
+class PivotSAW():
+  """ Class for the pivot algorithm, a Markov chain over the 
+  Self-Avoiding Walks with fixed length n. Each move picks a pivot 
+  point and applies one of the 7 non-trivial symmetries of the square 
+  lattice to the part of the walk on one side of it. The occupied 
+  sites are kept in a hash table, and the new sites are checked from 
+  the pivot outward in chunks of doubling size, so most rejected 
+  moves are found after looking at a few sites only.
+
+  On the unbounded lattice the shorter side of the walk is moved. On a 
+  NxN grid the initial point is kept fixed, so the end of the walk is 
+  always the moving part and moves that leave the grid are rejected.
+
+  Parameters
+  ----------------------------------
+  n (int): Length of the walks.
+  N (int): Size of the latice, if None the lattice is unbounded.
+           (default=None)
+  initial_x (int): Initial x point, on a NxN grid it must be a corner.
+  initial_y (int): Initial y point, on a NxN grid it must be a corner.
+  rng (RandomBuffer, np.random.Generator, int or None): Random number 
+                    generator or seed. (default=None)
+  """
+  __slots__ = ('n', 'N', 'initial_x', 'initial_y', 'random', 'index', 
+               'attempts', 'accepted', '_x', '_y')
+
+  # Rotations by 90, 180 and 270 degrees and the four reflections
+  SYMMETRIES = ((0, -1, 1, 0), (-1, 0, 0, -1), (0, 1, -1, 0),
+                (1, 0, 0, -1), (-1, 0, 0, 1), (0, 1, 1, 0), (0, -1, -1, 0))
+
+  # Sites are hashed as x*KEY_BASE + y
+  KEY_BASE = 1 << 32
+
+  def __init__(self, 
+               n: int, 
+               N: int=None, 
+               initial_x: int=0, 
+               initial_y: int=0, 
+               rng=None):
+    self.n = n
+    self.N = N
+    self.initial_x = initial_x
+    self.initial_y = initial_y
+    self.random = random_buffer(rng)
+    self.attempts = 0
+    self.accepted = 0
+    
+    self._x, self._y = self._initial_walk()
+    keys = (self._x*self.KEY_BASE + self._y).tolist()
+    self.index = dict(zip(keys, range(n + 1)))
+
+  def _initial_walk(self):
+    """ Creates a straight walk on the unbounded lattice or a walk 
+    that goes back and forth along the rows of the NxN grid.
+
+    Outputs
+    -----------------------------------
+    (np.array): x points of the walk.
+    (np.array): y points of the walk.
+
+    """
+    n, N = self.n, self.N
+    if N is None:
+      x = np.full(n + 1, self.initial_x, dtype=np.int64)
+      y = self.initial_y + np.arange(n + 1, dtype=np.int64)
+      return x, y
+    
+    assert n < N*N, "The walk does not fit in the grid."
+    assert (self.initial_x in (0, N - 1) and self.initial_y in (0, N - 1)), \
+           "The initial point must be a corner of the grid."
+    x, y = np.divmod(np.arange(n + 1, dtype=np.int64), N)
+    y = np.where(x % 2 == 0, y, N - 1 - y)
+    if self.initial_x == N - 1:
+      x = N - 1 - x
+    if self.initial_y == N - 1:
+      y = N - 1 - y
+    return x, y
+
+  def step(self):
+    """ Attempts one pivot move.
+
+    Outputs
+    -----------------------------------
+    (bool): True if the move was accepted.
+
+    """
+    n, N = self.n, self.N
+    x, y = self._x, self._y
+    index = self.index
+    self.attempts += 1
+
+    pivot = int(self.random.uniform()*n)
+    a, b, c, d = self.SYMMETRIES[int(self.random.uniform()*7)]
+    
+    # The moving part is never empty, on the unbounded lattice the 
+    # head moves when it is the shorter side
+    head = N is None and 0 < pivot < n//2
+    size = pivot if head else n - pivot
+
+    px, py = x[pivot], y[pivot]
+    new_x, new_y, new_keys = [], [], []
+    start, chunk = 0, 16
+    while start < size:
+      # Indices of the next chunk of the moving part, from the pivot 
+      # outward, so a rejected move only looks at a few sites
+      stop = min(start + chunk, size)
+      if head:
+        part = np.arange(pivot - stop, pivot - start)[::-1]
+      else:
+        part = np.arange(pivot + 1 + start, pivot + 1 + stop)
+      dx, dy = x[part] - px, y[part] - py
+      nx = px + a*dx + b*dy
+      ny = py + c*dx + d*dy
+      
+      # Reject at the walls
+      if N is not None and (nx.min() < 0 or ny.min() < 0 or 
+                            nx.max() >= N or ny.max() >= N):
+        return False
+      
+      # Reject if the new site is on the fixed part of the walk
+      keys = (nx*self.KEY_BASE + ny).tolist()
+      for key in keys:
+        j = index.get(key)
+        if j is not None and (j >= pivot if head else j <= pivot):
+          return False
+      
+      new_x.append(nx)
+      new_y.append(ny)
+      new_keys.extend(keys)
+      start = stop
+      chunk *= 2
+
+    # Accept the move
+    if head:
+      moving = np.arange(pivot - 1, -1, -1)
+    else:
+      moving = np.arange(pivot + 1, n + 1)
+    for key in (x[moving]*self.KEY_BASE + y[moving]).tolist():
+      del index[key]
+    index.update(zip(new_keys, moving.tolist()))
+    x[moving] = np.concatenate(new_x)
+    y[moving] = np.concatenate(new_y)
+    
+    self.accepted += 1
+    return True
+
+  def run(self, attempts: int):
+    """ Attempts a number of pivot moves.
+
+    Parameters
+    -----------------------------------
+    attempts (int): Number of moves.
+
+    Outputs
+    -----------------------------------
+    (float): Fraction of accepted moves.
+
+    """
+    accepted = 0
+    for _ in range(attempts):
+      accepted += self.step()
+    return accepted/attempts
+
+  def sample(self, samples: int, thin: int=1):
+    """ Samples the squared end-to-end distance along the chain.
+
+    Parameters
+    -----------------------------------
+    samples (int): Number of samples.
+    thin (int): Number of moves between samples. (default=1)
+
+    Outputs
+    -----------------------------------
+    (np.array): Squared end-to-end distances.
+
+    """
+    r2 = np.empty(samples)
+    for s in range(samples):
+      self.run(thin)
+      r2[s] = self.end_to_end
+    return r2
+
+  @property
+  def x(self):
+    """ Returns the x points of the walk, starting at initial_x.
+
+    """
+    return self._x - self._x[0] + self.initial_x
+
+  @property
+  def y(self):
+    """ Returns the y points of the walk, starting at initial_y.
+
+    """
+    return self._y - self._y[0] + self.initial_y
+
+  @property
+  def end_to_end(self):
+    """ Returns the squared end-to-end distance of the walk.
+
+    """
+    return int((self._x[-1] - self._x[0])**2 + (self._y[-1] - self._y[0])**2)
+
+  @property
+  def acceptance_fraction(self):
+    """ Returns the fraction of accepted moves.
+
+    """
+    return self.accepted/max(self.attempts, 1)
+
+
+@lru_cache(maxsize=32)
+def short_walks(n: int):
+  """ Enumerates every Self-Avoiding Walk with n steps from the origin 
+  of the unbounded square lattice. The walks of n steps are made by 
+  extending the cached walks of n-1 steps, so the table is built once 
+  and shared by every sampler. It must not be modified.
+
+  Parameters
+  -----------------------------------
+  n (int): Number of steps.
+
+  Outputs
+  -----------------------------------
+  (np.array): Directions 1,2,3,4 of the walks as uint8, one walk per row.
+
+  """
+  if n == 0:
+    walks = np.zeros((1, 0), dtype=np.uint8)
+    walks.flags.writeable = False
+    return walks
+
+  shorter = short_walks(n - 1)
+  x = np.zeros((shorter.shape[0], n), dtype=np.int64)
+  y = np.zeros((shorter.shape[0], n), dtype=np.int64)
+  x[:,1:] = np.cumsum(WalkRecord.DX[shorter - 1], axis=1)
+  y[:,1:] = np.cumsum(WalkRecord.DY[shorter - 1], axis=1)
+  keys = x*PivotSAW.KEY_BASE + y
+
+  extended = []
+  for direction in DIRECTIONS:
+    end = ((x[:,-1] + WalkRecord.DX[direction - 1])*PivotSAW.KEY_BASE 
+           + y[:,-1] + WalkRecord.DY[direction - 1])
+    avoids = ~(keys == end[:,None]).any(axis=1)
+    walks = np.empty((avoids.sum(), n), dtype=np.uint8)
+    walks[:,:-1] = shorter[avoids]
+    walks[:,-1] = direction
+    extended.append(walks)
+  
+  walks = np.concatenate(extended)
+  walks.flags.writeable = False
+  return walks
+
+@lru_cache(maxsize=32)
+def _short_walk_keys(n: int):
+  """ Returns the sites x*KEY_BASE + y of the walks of short_walks(n) 
+  as lists of ints, one list per walk.
+
+  """
+  walks = short_walks(n)
+  x = np.zeros((walks.shape[0], n + 1), dtype=np.int64)
+  y = np.zeros((walks.shape[0], n + 1), dtype=np.int64)
+  x[:,1:] = np.cumsum(WalkRecord.DX[walks - 1], axis=1)
+  y[:,1:] = np.cumsum(WalkRecord.DY[walks - 1], axis=1)
+  return (x*PivotSAW.KEY_BASE + y).tolist()
+
+
+class DimerizationSAW():
+  """ Class for the dimerization algorithm, it samples uniformly the 
+  Self-Avoiding Walks with n steps on the unbounded lattice. A walk of 
+  n steps is made by joining two independent walks of n//2 and n-n//2 
+  steps, and both halves are sampled again when they intersect. The 
+  halves are made in the same way down to walks of at most base steps, 
+  which are drawn from the cached table of short_walks. The halves are 
+  kept as lists of the hashed sites x*KEY_BASE + y, so the second half 
+  is moved to the end of the first one by a single addition, and it is 
+  checked from the junction outward, where most intersections are.
+  The number of attempts grows faster than any power of n, so it is
+  meant for walks of up to a few thousand steps.
+
+  Parameters
+  ----------------------------------
+  n (int): Length of the walks.
+  base (int): Largest length drawn from the table. (default=10)
+  initial_x (int): Initial x point.
+  initial_y (int): Initial y point.
+  rng (RandomBuffer, np.random.Generator, int or None): Random number 
+                    generator or seed. (default=None)
+  """
+  __slots__ = ('n', 'base', 'initial_x', 'initial_y', 'random', 
+               'attempts', '_x', '_y')
+
+  # Sites are hashed as x*KEY_BASE + y
+  KEY_BASE = PivotSAW.KEY_BASE
+
+  def __init__(self, 
+               n: int, 
+               base: int=10, 
+               initial_x: int=0, 
+               initial_y: int=0, 
+               rng=None):
+    self.n = n
+    self.base = base
+    self.initial_x = initial_x
+    self.initial_y = initial_y
+    self.random = random_buffer(rng)
+    self.attempts = 0
+    self.sample()
+
+  def sample(self):
+    """ Samples a new walk.
+
+    Outputs
+    -----------------------------------
+    (np.array): Directions 1,2,3,4 of the walk.
+
+    """
+    keys = np.array(self._dimerize(self.n), dtype=np.int64)
+    self._x = (keys + self.KEY_BASE//2)//self.KEY_BASE
+    self._y = keys - self._x*self.KEY_BASE
+    return self.directions
+
+  def _dimerize(self, n: int):
+    """ Samples uniformly a walk with n steps.
+
+    Parameters
+    -----------------------------------
+    n (int): Number of steps.
+
+    Outputs
+    -----------------------------------
+    (list): Sites x*KEY_BASE + y of the walk, starting at the origin.
+
+    """
+    if n <= self.base:
+      walks = _short_walk_keys(n)
+      return walks[int(self.random.uniform()*len(walks))]
+
+    half = n//2
+    while True:
+      self.attempts += 1
+      first = self._dimerize(half)
+      second = self._dimerize(n - half)
+      
+      # The second half starts at the end of the first one
+      end = first[-1]
+      occupied = set(first)
+      for key in second[1:]:
+        if key + end in occupied:
+          break
+      else:
+        return first + [key + end for key in second[1:]]
+
+  def record(self):
+    """ Returns the compact record of the walk.
+
+    """
+    return WalkRecord.from_path(self.x, self.y)
+
+  @property
+  def directions(self):
+    """ Returns the directions 1,2,3,4 of the walk.
+
+    """
+    return self.record().directions
+
+  @property
+  def x(self):
+    """ Returns the x points of the walk.
+
+    """
+    return self._x + self.initial_x
+
+  @property
+  def y(self):
+    """ Returns the y points of the walk.
+
+    """
+    return self._y + self.initial_y
+
+  @property
+  def end_to_end(self):
+    """ Returns the squared end-to-end distance of the walk.
+
+    """
+    return int(self._x[-1]**2 + self._y[-1]**2)
+
+
+class UnboundedSAW():
+  """ Class for the Self-Avoiding Walk without a grid restriction. The 
+  walker grows n steps, choosing uniformly among the free neighbors, 
+  and stops early if it gets stuck. The sites are hashed as a single 
+  integer x*KEY_BASE + y, so the neighbors are found by adding the 
+  offsets of the directions 1,2,3,4, as on the flat grid of SAW, and 
+  the occupied sites are a set of ints. The path is kept as an array 
+  of the hashed sites, so long walks do not allocate a tuple per site.
+
+  In d dimensions the 64 bits of the hash are split among the d 
+  coordinates, key_base = 2**(64//d), and the offsets of the 2d 
+  directions are the powers of key_base as in `hypercubic_lattice`. 
+  The coordinates must stay below key_base/2 in size.
+
+  Parameters
+  ----------------------------------
+  n (int): Largest number of steps.
+  initial_x (int): Initial x point.
+  initial_y (int): Initial y point.
+  rng (RandomBuffer, np.random.Generator, int or None): Random number 
+                    generator or seed. (default=None)
+  d (int): Dimension of the lattice. (default=2)
+  """
+  __slots__ = ('n', 'd', 'key_base', 'offsets', 'initial_x', 'initial_y', 
+               'random', 'n_walks', 'is_stuck', 'log_weight', '_keys', '_k')
+
+  # Sites of the square lattice are hashed as x*KEY_BASE + y
+  KEY_BASE = PivotSAW.KEY_BASE
+
+  def __init__(self, 
+               n: int, 
+               initial_x: int=0, 
+               initial_y: int=0, 
+               rng=None,
+               d: int=2):
+    self.n = n
+    self.d = d
+    self.key_base = 1 << (64//d)
+    self.offsets = tuple(sign*self.key_base**axis 
+                         for axis in range(d) for sign in (-1, 1))
+    self.initial_x = initial_x
+    self.initial_y = initial_y
+    self.random = random_buffer(rng)
+    self.n_walks = self.run()
+
+  def run(self):
+    """ Makes a new walk.
+
+    Outputs
+    -----------------------------------
+    (int): number of steps.
+
+    """
+    self.n_walks = self._evolution()
+    return self.n_walks
+
+  def _evolution(self):
+    """ Makes the evolution of the SAW.
+
+    Outputs
+    -----------------------------------
+    (int): number of steps. 
+
+    """
+    offsets = self.offsets
+    log_k = [0.] + [log(k) for k in range(1, 2*self.d + 1)]
+    uniform = self.random.uniform
+    
+    site = 0
+    occupied = {site}
+    keys = array('q', [site])
+    ks = array('B')
+    log_weight = 0.
+    self.is_stuck = False
+
+    for _ in range(self.n):
+      possible = [site + offset for offset in offsets 
+                  if site + offset not in occupied]
+      k = len(possible)
+      
+      # If there is no possible step, it is stuck
+      if k == 0:
+        self.is_stuck = True
+        break
+      
+      ks.append(k)
+      log_weight += log_k[k]
+      site = possible[int(uniform()*k)]
+      occupied.add(site)
+      keys.append(site)
+
+    self._keys = keys
+    self._k = ks
+    self.log_weight = log_weight
+    return len(keys) - 1
+
+  def _unhash(self, keys: np.array):
+    """ Returns the points of hashed sites, with shape (...,d).
+
+    """
+    base, half = self.key_base, self.key_base//2
+    coordinates = []
+    for _ in range(self.d):
+      coordinate = (keys + half) % base - half
+      coordinates.append(coordinate)
+      keys = (keys - coordinate)//base
+    return np.stack(coordinates[::-1], axis=-1)
+
+  @property
+  def points(self):
+    """ Returns the points of the walk from the origin, with shape 
+    (n+1,d).
+
+    """
+    return self._unhash(np.frombuffer(self._keys, dtype=np.int64))
+
+  @property
+  def x(self):
+    """ Returns the x points of the walk.
+
+    """
+    return self.points[:,0] + self.initial_x
+
+  @property
+  def y(self):
+    """ Returns the y points of the walk.
+
+    """
+    return self.points[:,1] + self.initial_y
+
+  @property
+  def k(self):
+    """ Returns the number of possible walks at each step as a view.
+
+    """
+    return np.frombuffer(self._k, dtype=np.uint8)
+
+  @property
+  def number_of_walks(self):
+    """ Returns the number of walks of the walker.
+
+    """
+    return self.n_walks
+
+  @property
+  def trial_probability(self):
+    """ Return the trial probability function, it underflows to 0 
+    for long walks, see `log_trial_probability`.
+
+    """
+    return np.exp(self.log_trial_probability)
+
+  @property
+  def log_trial_probability(self):
+    """ Return the log of the trial probability function.
+
+    """
+    return -self.log_weight
+
+  @property
+  def end_to_end(self):
+    """ Returns the squared end-to-end distance of the walk.
+
+    """
+    end = self._unhash(np.int64(self._keys[-1]))
+    return int((end**2).sum())
+
+  def record(self):
+    """ Returns the walk as a compact WalkRecord.
+
+    """
+    return WalkRecord.from_path(self.x, self.y)